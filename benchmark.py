@@ -0,0 +1,197 @@
+# encoding: UTF-8
+"""Benchmarks for the Reed-Solomon coder and the arithmetic under it.
+
+Times RSCoder.encode, verify and decode over a grid of (n, k) codes, decoding
+blocks with every number of errors from 0 to (n-k)/2 with each of the key
+equation solvers in rs.SOLVERS, and the Polynomial and PF59int operations the
+coder is built from. Rates are reported in blocks per
+second and symbols per second (operations per second for the building blocks)
+and can be written to a JSON file with -o.
+
+With --compare, the results are checked against a JSON file from an earlier
+run, and any benchmark that got slower by more than --threshold is reported as
+a regression, in which case the exit status is 1.
+
+Usage: python benchmark.py [-o results.json] [--compare baseline.json]
+                           [--solver euclid]
+"""
+import json
+import random
+import sys
+import time
+
+import rs
+from ffp import PF59int
+from polynomial import Polynomial
+
+# The (n, k) codes benchmarked by default
+GRID = ((58, 46), (58, 40), (20, 12), (10, 8))
+
+def _rate(func, items, repeat=3, mintime=0.05):
+    """Calls func on every item, and returns the number of items per second
+    of the fastest of repeat runs. The items are run through several times
+    per run if that takes less than mintime."""
+    loops = 1
+    while True:
+        start = time.time()
+        for l in xrange(loops):
+            for item in items:
+                func(item)
+        elapsed = time.time() - start
+        if elapsed >= mintime:
+            break
+        loops *= 2
+
+    best = elapsed
+    for r in xrange(repeat - 1):
+        start = time.time()
+        for l in xrange(loops):
+            for item in items:
+                func(item)
+        best = min(best, time.time() - start)
+    return len(items) * loops / max(best, 1e-9)
+
+def _damage(rand, code, errors):
+    """Returns code with errors random symbols changed"""
+    r = map(rs.b58conv, code)
+    for e in rand.sample(xrange(len(r)), errors):
+        r[e] = (r[e] + rand.randint(1, 58)) % 59
+    return "".join(rs.r58conv(x) for x in r)
+
+def bench_coder(n, k, blocks=100, seed=0, solvers=rs.SOLVERS, **options):
+    """Benchmarks an RSCoder(n, k) and returns a dict from benchmark names
+    to dicts of rates. Decoding is timed with each of the given solvers, the
+    default one under the plain "decode" names and the others as, for
+    example, "decode[euclid]"."""
+    rand = random.Random(seed)
+    coder = rs.RSCoder(n, k)
+    messages = ["".join(rs.r58conv(rand.randint(1, 58)) for i in xrange(k))
+            for b in xrange(blocks)]
+    codes = map(coder.encode, messages)
+
+    results = {}
+    def add(name, per_second, symbols):
+        results["%s %d,%d" % (name, n, k)] = {
+                'blocks/s': per_second,
+                'symbols/s': per_second * symbols,
+                }
+
+    add("encode", _rate(coder.encode, messages, **options), k)
+    add("verify", _rate(coder.verify, codes, **options), n)
+    damaged = [[_damage(rand, c, errors) for c in codes]
+            for errors in xrange((n-k)//2 + 1)]
+    for solver in solvers:
+        decode = rs.RSCoder(n, k, solver=solver).decode
+        name = "decode" if solver == rs.BERLEKAMP_MASSEY else \
+                "decode[%s]" % solver
+        for errors, received in enumerate(damaged):
+            add("%s e=%d" % (name, errors), _rate(decode, received, **options),
+                    n)
+    return results
+
+def bench_primitives(seed=0, **options):
+    """Benchmarks the Polynomial and PF59int operations and returns a dict
+    from benchmark names to dicts of rates"""
+    rand = random.Random(seed)
+    def poly(length):
+        return Polynomial(rand.randint(1, 58) for i in xrange(length))
+    # A 46 symbol message shifted up by the parity and a (58,46) generator
+    pairs = [(poly(58), poly(13)) for i in xrange(50)]
+    elements = [(PF59int(rand.randint(1, 58)), PF59int(rand.randint(1, 58)))
+            for i in xrange(500)]
+
+    benchmarks = (
+            ("Polynomial.__mul__", lambda (a, b): a * b, pairs),
+            ("Polynomial.__divmod__", lambda (a, b): divmod(a, b), pairs),
+            ("Polynomial.evaluate", lambda (a, b): a.evaluate(b.raw[0]), pairs),
+            ("Polynomial.evaluate_all", lambda (a, b): a.evaluate_all(), pairs),
+            ("PF59int.__add__", lambda (a, b): a + b, elements),
+            ("PF59int.__mul__", lambda (a, b): a * b, elements),
+            ("PF59int.__div__", lambda (a, b): a / b, elements),
+            ("PF59int.__pow__", lambda (a, b): a ** int(b), elements),
+            )
+    return dict((name, {'ops/s': _rate(func, items, **options)})
+            for name, func, items in benchmarks)
+
+def run(grid=GRID, blocks=100, seed=0, solvers=rs.SOLVERS, **options):
+    """Runs every benchmark and returns the results, in the form written to
+    the JSON file"""
+    results = bench_primitives(seed, **options)
+    for n, k in grid:
+        results.update(bench_coder(n, k, blocks, seed, solvers, **options))
+    return {
+            'python': sys.version.split()[0],
+            'numpy': rs.numpy is not None,
+            'results': results,
+            }
+
+def compare(results, baseline, threshold=0.1):
+    """Compares two sets of results from run(). Returns a sorted list of
+    (name, unit, baseline rate, new rate) for every rate in both that
+    dropped by more than the threshold fraction."""
+    regressions = []
+    old = baseline['results']
+    for name, rates in results['results'].iteritems():
+        for unit, rate in rates.iteritems():
+            before = old.get(name, {}).get(unit)
+            if before and rate < before * (1 - threshold):
+                regressions.append((name, unit, before, rate))
+    regressions.sort()
+    return regressions
+
+def _code(value):
+    """Parses an n,k pair from the command line"""
+    n, k = map(int, value.split(","))
+    return n, k
+
+def main(argv=None):
+    """Command line entry point, see the module documentation"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmarks the "
+            "Reed-Solomon coder.")
+    parser.add_argument("-o", "--output",
+            help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE",
+            help="report regressions against this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+            help="slowdown counted as a regression (default 0.1, 10%%)")
+    parser.add_argument("--code", type=_code, action="append",
+            metavar="N,K", help="code to benchmark, may be repeated "
+            "(default %s)" % " ".join("%d,%d" % c for c in GRID))
+    parser.add_argument("--solver", choices=rs.SOLVERS, action="append",
+            help="key equation solver to decode with, may be repeated "
+            "(default all of them)")
+    parser.add_argument("--blocks", type=int, default=100,
+            help="distinct blocks per benchmark (default 100)")
+    parser.add_argument("--quick", action="store_true",
+            help="one short run per benchmark, for checking the harness")
+    args = parser.parse_args(argv)
+
+    options = {}
+    if args.quick:
+        options = {'repeat': 1, 'mintime': 0}
+    results = run(args.code or GRID, args.blocks,
+            solvers=args.solver or rs.SOLVERS, **options)
+
+    for name in sorted(results['results']):
+        for unit, rate in sorted(results['results'][name].iteritems()):
+            print "%-28s %14.0f %s" % (name, rate, unit)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for name, unit, before, after in regressions:
+            print "REGRESSION %s: %.0f -> %.0f %s (%+.1f%%)" % (name, before,
+                    after, unit, 100.0 * (after - before) / before)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import unittest
+
+import benchmark
+
+class TestBenchmark(unittest.TestCase):
+    def test_run(self):
+        """A quick run covers every error count and writes both rates"""
+        results = benchmark.run(((10, 6),), blocks=3, repeat=1, mintime=0)
+        names = set(results['results'])
+        self.assertTrue(set(["encode 10,6", "verify 10,6", "decode e=0 10,6",
+            "decode e=1 10,6", "decode e=2 10,6", "decode[euclid] e=2 10,6",
+            "Polynomial.__divmod__"]) <= names)
+        self.assertFalse("decode e=3 10,6" in names)
+        rates = results['results']["decode e=2 10,6"]
+        self.assertAlmostEqual(rates['symbols/s'], rates['blocks/s'] * 10)
+
+    def test_compare(self):
+        baseline = {'results': {
+            "encode 58,46": {'blocks/s': 1000.0},
+            "verify 58,46": {'blocks/s': 1000.0},
+            "gone": {'blocks/s': 1000.0},
+            }}
+        results = {'results': {
+            "encode 58,46": {'blocks/s': 850.0},
+            "verify 58,46": {'blocks/s': 950.0},
+            "new": {'blocks/s': 1.0},
+            }}
+        self.assertEqual(benchmark.compare(results, baseline),
+                [("encode 58,46", 'blocks/s', 1000.0, 850.0)])
+        self.assertEqual(benchmark.compare(results, baseline, 0.2), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,70 +2,102 @@
 # Copyright (c) 2013 Ryan Castellucci <code@ryanc.org>
 # See LICENSE.txt for license terms
 
-class PF59int(int):
-    """Instances of this object are elements of the field GF(2^8)
-    Instances are integers in the range 0 to 255
-    This field is defined using the irreducable polynomial
-    x^8 + x^4 + x^3 + x + 1
-    and using 3 as the generator for the exponent table and log table.
-    """
-    # Maps integers to PF59int instances
-    cache = {}
-    # multiplicitive inverse table, modulo 59
-    invtable = (None, 1, 30, 20, 15, 12, 10, 17, 37, 46, 6, 43, 5, 50, 38, 4, 48,
-            7, 23, 28, 3, 45, 51, 18, 32, 26, 25, 35, 19, 57, 2, 40, 24, 34,
-	    33, 27, 41, 8, 14, 56, 31, 36, 52, 11, 55, 21, 9, 54, 16, 53, 13,
-	    22, 42, 49, 47, 44, 39, 29, 58)
+# Fields below this size get full addition, subtraction, multiplication and
+# power tables. Larger fields would need too much memory for them, and their
+# elements are combined with plain modular arithmetic instead.
+TABLE_LIMIT = 512
+
+# Fields must be smaller than this, so that sums of products of elements stay
+# exact in floating point, which the NumPy matrix products in rs.py rely on
+MAX_PRIME = 1 << 17
 
+class PFint(int):
+    """Base class of the field element classes made by PrimeField().
+
+    All arithmetic goes through the class attributes of the field: p is the
+    prime, order = p-1 the order of its multiplicative group, and generator
+    a primitive root that generates it. invtable, exptable and logtable
+    exist for every field, and addtable, subtable, multable and powtable
+    only for fields smaller than TABLE_LIMIT, being None otherwise, in
+    which case the operations use plain modular arithmetic.
+    """
     def __new__(cls, value):
-        # Check cache
-        # Caching sacrifices a bit of speed for less memory usage. This way,
-        # there are only a max of 59 instances of this class at any time.
-	try:
-            return PF59int.cache[value]
+        # Every field element already exists, so this is just a lookup
+        try:
+            return cls.cache[value]
         except KeyError:
-            if value > 58 or value < 0:
-                raise ValueError("Field elements of PF(59) are between 0 and 58. Cannot be %s" % value)
+            raise ValueError("Field elements of PF(%d) are between 0 and %d. "
+                    "Cannot be %s" % (cls.p, cls.p - 1, value))
 
-            newval = int.__new__(cls, value)
-            PF59int.cache[int(value)] = newval
-            return newval
+    def __reduce__(self):
+        # Field classes other than PF59int aren't module attributes, so they
+        # are looked up through PrimeField() when unpickling
+        return (_element, (self.p, int(self)))
 
     def __add__(a, b):
-        "Addition in PF(59) is normal addition modulo 59"
-        return PF59int((int(a) + int(b)) % 59)
+        "Addition in PF(p) is normal addition modulo p"
+        F = a.__class__
+        if F.addtable is not None:
+            try:
+                return F.elements[F.addtable[a][b]]
+            except (IndexError, TypeError):
+                pass
+        return F.elements[(int(a) + int(b)) % F.p]
     __radd__ = __add__
 
     def __sub__(a, b):
-	"Subtraction in PF(59) is normal subtraction modulo 59"
-	# Python's modulo operator handles negitive numbers. If we didn't, we
-	# could just add 59 to a before subtracting b
-	return PF59int((int(a) - int(b)) % 59)
+        "Subtraction in PF(p) is normal subtraction modulo p"
+        F = a.__class__
+        if F.subtable is not None:
+            try:
+                return F.elements[F.subtable[a][b]]
+            except (IndexError, TypeError):
+                pass
+        return F.elements[(int(a) - int(b)) % F.p]
 
     def __rsub__(a, b):
         # We have to reverse the argument order for rsub
-	return PF59int((int(b) - int(a)) % 59)
+        F = a.__class__
+        if F.subtable is not None:
+            try:
+                return F.elements[F.subtable[b][a]]
+            except (IndexError, TypeError):
+                pass
+        return F.elements[(int(b) - int(a)) % F.p]
 
     def __neg__(self):
-        return PF59int((59 - int(self)) % 59)
-    
+        F = self.__class__
+        return F.elements[-int(self) % F.p]
+
     def __mul__(a, b):
-        "Multiplication in PF(59)"
-        return PF59int((int(a) * int(b)) % 59)
+        "Multiplication in PF(p)"
+        F = a.__class__
+        if F.multable is not None:
+            try:
+                return F.elements[F.multable[a][b]]
+            except (IndexError, TypeError):
+                pass
+        return F.elements[(int(a) * int(b)) % F.p]
     __rmul__ = __mul__
 
     def __pow__(self, power):
-        if isinstance(power, PF59int):
+        F = self.__class__
+        if isinstance(power, PFint):
             raise TypeError("Raising a Field element to another Field element is not defined. power must be a regular integer")
-        if (power < 0):
-            return PF59int(pow(int(self), -power, 59)).inverse()
-        return PF59int(pow(int(self), power, 59))
+        if self == 0:
+            if power < 0:
+                raise ZeroDivisionError("0 has no inverse in PF(%d)" % F.p)
+            return F.elements[0 if power else 1]
+        return F.elements[F.exptable[(F.logtable[self] * power) % F.order]]
 
     def inverse(self):
-        return PF59int(PF59int.invtable[self])
+        F = self.__class__
+        if self == 0:
+            raise ZeroDivisionError("0 has no inverse in PF(%d)" % F.p)
+        return F.elements[F.invtable[self]]
 
     def __div__(self, other):
-        return self * PF59int(other).inverse()
+        return self * self.__class__(other).inverse()
     def __rdiv__(self, other):
         return self.inverse() * other
 
@@ -74,22 +106,103 @@ class PF59int(int):
         return "%s(%r)" % (n, int(self))
 
     multiply = __mul__
-#    def multiply(self, other):
-#        """A slow multiply method. This method gives the same results as the
-#        other multiply method, but is implemented to illustrate how it works
-#        and how the above tables were generated.
-#
-#        This procedure is called Peasant's Algorithm (I believe)
-#        """
-#        a = int(self)
-#        b = int(other)
-#
-#        p = a
-#        r = 0
-#        while b:
-#            if b & 1: r = r ^ p
-#            b = b >> 1
-#            p = p << 1
-#            if p & 0x100: p = p ^ 0x11b
-#
-#        return PF59int(r)
+
+def _factors(n):
+    """Returns the distinct prime factors of n"""
+    factors = []
+    d = 2
+    while d * d <= n:
+        if n % d == 0:
+            factors.append(d)
+            while n % d == 0:
+                n //= d
+        d += 1
+    if n > 1:
+        factors.append(n)
+    return factors
+
+def PrimeField(p):
+    """Returns the class of the elements of the prime field PF(p), the
+    integers modulo the prime p, creating it and its tables on first use.
+    The class is a subclass of PFint named PF<p>int, and every call for the
+    same p returns the same class, so PrimeField(59) is PF59int.
+
+    The generator is the smallest primitive root of p. The exponent table
+    is twice as long as it needs to be so that exptable[logtable[a] +
+    logtable[b]] never needs a modulo, and 0 has no logarithm or inverse.
+    Building the tables takes time and memory linear in p, or quadratic for
+    fields below TABLE_LIMIT.
+    """
+    try:
+        return PrimeField.cache[p]
+    except KeyError:
+        pass
+
+    if not 2 < p < MAX_PRIME or _factors(p) != [p]:
+        raise ValueError("A prime field needs an odd prime below %d, not %s"
+                % (MAX_PRIME, p))
+    order = p - 1
+    factors = _factors(order)
+    generator = 2
+    while any(pow(generator, order // q, p) == 1 for q in factors):
+        generator += 1
+
+    exptable = [1] * (2 * order)
+    for i in xrange(1, 2 * order):
+        exptable[i] = exptable[i-1] * generator % p
+    logtable = [None] * p
+    for i in xrange(order):
+        logtable[exptable[i]] = i
+    invtable = [None] + [exptable[(order - logtable[a]) % order]
+            for a in xrange(1, p)]
+
+    attrs = {
+        '__doc__': "Instances of this object are elements of the field "
+                "PF(%d), the integers 0 to %d, with %d as the generator. See "
+                "PFint." % (p, p - 1, generator),
+        '__slots__': (),
+        'p': p,
+        'order': order,
+        'generator': generator,
+        'invtable': tuple(invtable),
+        'exptable': tuple(exptable),
+        'logtable': tuple(logtable),
+        'addtable': None,
+        'subtable': None,
+        'multable': None,
+        'powtable': None,
+        # The array typecode that holds the elements
+        'typecode': 'B' if p <= 256 else 'H' if p <= 65536 else 'I',
+    }
+    if p < TABLE_LIMIT:
+        # Full p x p operation tables, indexed as table[a][b]. Since they
+        # are tuples, negative indexes down to -p also give the right answer.
+        # powtable[a][e] is a**e modulo p, for e below the order, which
+        # covers every power of a non-zero a.
+        r = xrange(p)
+        attrs['addtable'] = tuple(tuple((a + b) % p for b in r) for a in r)
+        attrs['subtable'] = tuple(tuple((a - b) % p for b in r) for a in r)
+        attrs['multable'] = tuple(tuple((a * b) % p for b in r) for a in r)
+        attrs['powtable'] = tuple(tuple(pow(a, e, p) for e in xrange(order))
+                for a in r)
+
+    field = type("PF%dint" % p, (PFint,), attrs)
+    # All p elements are created once, so there are only ever p instances.
+    # elements holds them indexable by their value, and cache maps integers
+    # to them.
+    field.elements = tuple(int.__new__(field, i) for i in xrange(p))
+    field.cache = dict(enumerate(field.elements))
+    PrimeField.cache[p] = field
+    return field
+
+# Maps primes to their field classes
+PrimeField.cache = {}
+
+def _element(p, value):
+    return PrimeField(p)(value)
+
+# Elements of PF(59), the field of the base 58 codes in rs.py. The tables are
+# also meant to be used directly: hot loops in polynomial.py and rs.py work on
+# plain ints in the range 0 to 58 and index e.g. PF59int.multable[a][b], only
+# wrapping results in PF59int at API boundaries.
+PF59int = PrimeField(59)
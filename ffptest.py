@@ -0,0 +1,100 @@
+import pickle
+import unittest
+
+from ffp import PF59int, PrimeField
+
+class TestPF59int(unittest.TestCase):
+    def test_tables(self):
+        """Checks the lookup tables against plain modular arithmetic"""
+        for a in xrange(59):
+            for b in xrange(59):
+                self.assertEqual(PF59int.addtable[a][b], (a + b) % 59)
+                self.assertEqual(PF59int.subtable[a][b], (a - b) % 59)
+                self.assertEqual(PF59int.multable[a][b], (a * b) % 59)
+            if a:
+                self.assertEqual(PF59int.multable[a][PF59int.invtable[a]], 1)
+                self.assertEqual(PF59int.exptable[PF59int.logtable[a]], a)
+            for e in xrange(58):
+                self.assertEqual(PF59int.powtable[a][e], pow(a, e, 59))
+
+    def test_ops(self):
+        a = PF59int(50)
+        b = PF59int(17)
+        self.assertEqual(a + b, 8)
+        self.assertEqual(a - b, 33)
+        self.assertEqual(b - a, 26)
+        self.assertEqual(-a, 9)
+        self.assertEqual(a * b, 24)
+        self.assertEqual(a / b * b, a)
+        self.assertTrue(isinstance(a * b, PF59int))
+
+        # Plain ints outside the field still work
+        self.assertEqual(a + 100, 32)
+        self.assertEqual(100 - a, 50)
+        self.assertEqual(a * -1, 9)
+
+    def test_pow(self):
+        for a in xrange(1, 59):
+            x = PF59int(a)
+            for power in xrange(-60, 60):
+                self.assertEqual(x**power,
+                        pow(a, power, 59) if power >= 0 else
+                        PF59int(pow(a, -power, 59)).inverse())
+        self.assertEqual(PF59int(0)**0, 1)
+        self.assertEqual(PF59int(0)**5, 0)
+        self.assertRaises(ZeroDivisionError, PF59int(0).inverse)
+
+    def test_instances(self):
+        """There is exactly one instance per field element"""
+        self.assertTrue(PF59int(5) is PF59int(5))
+        self.assertTrue(PF59int(3) * PF59int(4) is PF59int(12))
+        self.assertRaises(ValueError, PF59int, 59)
+        self.assertRaises(ValueError, PF59int, -1)
+
+class TestPrimeField(unittest.TestCase):
+    def test_cached(self):
+        self.assertTrue(PrimeField(59) is PF59int)
+        self.assertTrue(PrimeField(257) is PrimeField(257))
+        self.assertEqual(PrimeField(257).__name__, "PF257int")
+        for p in (1, 2, 57, 65536, 1 << 17, 196613):
+            self.assertRaises(ValueError, PrimeField, p)
+
+    def test_tables(self):
+        """The log and exponent tables of each field come from a generator
+        of the whole multiplicative group"""
+        for p, generator, typecode in ((3, 2, 'B'), (257, 3, 'H'),
+                (65537, 3, 'I')):
+            F = PrimeField(p)
+            self.assertEqual((F.generator, F.order, F.typecode),
+                    (generator, p - 1, typecode))
+            self.assertEqual(len(F.exptable), 2 * (p - 1))
+            self.assertEqual(sorted(F.exptable[:p-1]), range(1, p))
+            for a in range(1, p, max(1, p // 500)):
+                self.assertEqual(F.exptable[F.logtable[a]], a)
+                self.assertEqual(a * F.invtable[a] % p, 1)
+        self.assertEqual(PrimeField(257).multable[200][100], 200 * 100 % 257)
+        self.assertEqual(PrimeField(65537).multable, None)
+
+    def test_ops(self):
+        for p in (257, 65537):
+            F = PrimeField(p)
+            a = F(p - 7)
+            b = F(12345 % p)
+            self.assertEqual(a + b, (p - 7 + 12345) % p)
+            self.assertEqual(a - b, (p - 7 - 12345) % p)
+            self.assertEqual(b - a, (12345 + 7) % p)
+            self.assertEqual(-a, 7)
+            self.assertEqual(a * b, (p - 7) * 12345 % p)
+            self.assertEqual(a / b * b, a)
+            self.assertEqual(a ** (p - 1), 1)
+            self.assertEqual(a ** -1, a.inverse())
+            self.assertTrue(isinstance(a * b, F))
+            self.assertTrue(a * b is F((p - 7) * 12345 % p))
+            self.assertEqual(a + 3 * p, a)
+            self.assertRaises(ValueError, F, p)
+            self.assertRaises(ZeroDivisionError, F(0).inverse)
+            self.assertEqual(repr(a), "PF%dint(%d)" % (p, p - 7))
+            self.assertTrue(pickle.loads(pickle.dumps(a)) is a)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+# encoding: UTF-8
+"""Block interleaving, to spread bursts of errors over several codewords.
+
+Errors on disk and on the wire tend to come in bursts, and a burst of more
+than (n-k)/2 symbols inside one codeword makes it uncorrectable even though
+the rest of the data is fine. Interleaving writes a group of depth codewords
+column by column: the first symbol of each codeword, then the second symbol of
+each, and so on. A burst of b symbols in the interleaved data then only hits
+each codeword of its group about b/depth times, so bursts of up to
+depth*(n-k)/2 symbols are corrected.
+
+Data is handled as strings of whole n symbol codewords. Full groups of depth
+codewords are transposed all at once with NumPy when it is available. A last,
+partial group of d codewords is interleaved with depth d, so the data never
+needs padding and the length alone tells deinterleave() what was done.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def _check(data, n, depth):
+    if n < 1 or depth < 1:
+        raise ValueError("n and depth must be at least 1")
+    if len(data) % n:
+        raise ValueError("Data must be a whole number of %d symbol "
+                "codewords. Data was %d" % (n, len(data)))
+
+def _transpose(data, rows, columns):
+    """Transposes consecutive rows x columns matrices stored row by row in
+    the string data, which holds a whole number of them"""
+    if numpy is not None:
+        a = numpy.frombuffer(data, dtype=numpy.uint8)
+        a = a.reshape(-1, rows, columns).transpose(0, 2, 1)
+        return a.tostring()
+    size = rows * columns
+    return "".join("".join(data[i+c:i+size:columns] for c in xrange(columns))
+            for i in xrange(0, len(data), size))
+
+def interleave(data, n, depth):
+    """Interleaves data, a string of n symbol codewords, in groups of depth
+    codewords"""
+    _check(data, n, depth)
+    full = len(data) - len(data) % (n * depth)
+    out = _transpose(data[:full], depth, n)
+    if full < len(data):
+        out += _transpose(data[full:], (len(data) - full) // n, n)
+    return out
+
+def deinterleave(data, n, depth):
+    """Undoes interleave(), given the same n and depth"""
+    _check(data, n, depth)
+    full = len(data) - len(data) % (n * depth)
+    out = _transpose(data[:full], n, depth)
+    if full < len(data):
+        out += _transpose(data[full:], n, (len(data) - full) // n)
+    return out
+
+def _groups(chunks, size):
+    """Regroups an iterable of strings into strings of a multiple of size
+    characters, followed by whatever is left at the end"""
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        cut = len(pending) - len(pending) % size
+        if cut:
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+def encode_stream(coder, messages, depth, groups=64):
+    """Encodes an iterable of messages with coder, an RSCoder, yielding the
+    interleaved codewords as strings of up to groups groups of depth
+    codewords each. Only one batch of messages is held at a time."""
+    batch = []
+    for message in messages:
+        batch.append(message)
+        if len(batch) == depth * groups:
+            yield interleave("".join(coder.encode_many(batch)), coder.n, depth)
+            batch = []
+    if batch:
+        yield interleave("".join(coder.encode_many(batch)), coder.n, depth)
+
+def decode_stream(coder, chunks, depth, groups=64, nostrip=False):
+    """Decodes interleaved data with coder, an RSCoder. chunks is an
+    iterable of strings, for example reads from a file, that don't need to
+    line up with groups. Yields (status, message, errors) for each codeword
+    like RSCoder.decode_many(), holding only groups groups of depth codewords
+    in memory at a time."""
+    n = coder.n
+    for data in _groups(chunks, n * depth * groups):
+        data = deinterleave(data, n, depth)
+        blocks = [data[i:i+n] for i in xrange(0, len(data), n)]
+        for result in coder.decode_many(blocks, batchsize=len(blocks),
+                nostrip=nostrip):
+            yield result
@@ -0,0 +1,68 @@
+import random
+import unittest
+
+import interleave
+import rs
+from rs import r58conv
+
+class TestInterleave(unittest.TestCase):
+    def setUp(self):
+        self.data = "".join(r58conv(i % 59) for i in xrange(7 * 23))
+
+    def test_layout(self):
+        """Codewords are written column by column within each group, and a
+        short last group gets its own depth"""
+        self.assertEqual(interleave.interleave("abcdefABCDEF123456", 6, 2),
+                "aAbBcCdDeEfF123456")
+        self.assertEqual(interleave.interleave("abcABCxyzXYZ!?.", 3, 2),
+                "aAbBcCxXyYzZ!?.")
+        self.assertEqual(interleave.deinterleave("aAbBcCxXyYzZ!?.", 3, 2),
+                "abcABCxyzXYZ!?.")
+        self.assertRaises(ValueError, interleave.interleave, "abcd", 3, 2)
+        self.assertRaises(ValueError, interleave.deinterleave, "abc", 3, 0)
+
+    def _check_roundtrip(self):
+        for depth in (1, 2, 5, 7, 8, 30):
+            mixed = interleave.interleave(self.data, 7, depth)
+            self.assertEqual(len(mixed), len(self.data))
+            self.assertEqual(interleave.deinterleave(mixed, 7, depth),
+                    self.data)
+
+    def test_roundtrip(self):
+        self._check_roundtrip()
+
+    def test_roundtrip_python(self):
+        """Interleaving without NumPy"""
+        numpy = interleave.numpy
+        interleave.numpy = None
+        try:
+            self._check_roundtrip()
+        finally:
+            interleave.numpy = numpy
+
+    def test_burst(self):
+        """A burst of depth*(n-k)/2 symbols is corrected, in a stream that
+        doesn't line up with the groups"""
+        coder = rs.RSCoder(20, 12)
+        rand = random.Random(20)
+        messages = ["".join(r58conv(rand.randint(1, 58)) for i in xrange(12))
+                for m in xrange(50)]
+        chunks = list(interleave.encode_stream(coder, iter(messages), 5,
+            groups=3))
+        self.assertEqual(len(chunks), 4)
+        data = bytearray("".join(chunks))
+        self.assertEqual(len(data), 50 * 20)
+        for start in (0, 333, 980):
+            for i in xrange(start, start+20):
+                data[i] = "Z" if data[i] != ord("Z") else "Y"
+
+        data = str(data)
+        chunks = (data[i:i+77] for i in xrange(0, len(data), 77))
+        results = list(interleave.decode_stream(coder, chunks, 5, groups=2))
+        self.assertEqual([message for status, message, errors in results],
+                messages)
+        self.assertEqual(set(status for status, message, errors in results),
+                set([rs.CLEAN, rs.CORRECTED]))
+
+if __name__ == "__main__":
+    unittest.main()
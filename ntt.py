@@ -0,0 +1,291 @@
+# encoding: UTF-8
+"""Number theoretic transforms, for fast arithmetic on long polynomials.
+
+An NTT is the discrete Fourier transform over a prime field PF(p): a sequence
+of N field elements is evaluated as a polynomial at the N powers of an N-th
+root of unity w. With N a power of two this takes O(N log N) steps with the
+radix-2 butterfly, and multiplying two polynomials becomes a pointwise product
+between a forward and an inverse transform. A field has roots of unity of
+every order dividing p-1, so the powers of two dividing p-1 bound the length:
+PF(65537) has transforms of up to 65536 points, PF(257) of up to 256 points,
+and PF(59) none worth having.
+
+convolve() multiplies sequences of coefficients. Convolver keeps the transform
+of a fixed sequence, for multiplying it by many others, and CodeTransforms
+uses Convolvers for the parity and syndromes of a Reed-Solomon code over such
+a field, see rs.CoderPlan. Transforms of one size are computed stage by stage
+with NumPy when it is available, and with plain loops otherwise.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def max_size(field):
+    """Returns the largest power of two dividing the order of field, the
+    longest NTT it has"""
+    size = 1
+    while field.order % (size * 2) == 0:
+        size *= 2
+    return size
+
+def transform_size(field, length):
+    """Returns the smallest NTT size of field that is at least length, or
+    None if length is more than max_size(field)"""
+    size = 1
+    while size < length:
+        size *= 2
+    if size > max_size(field):
+        return None
+    return size
+
+class NTT(object):
+    """The forward and inverse transforms of one power of two size over one
+    field. get() shares them between callers."""
+    # Maps (p, size) to NTT instances
+    cache = {}
+
+    def __init__(self, field, size):
+        if field.order % size or size & (size - 1):
+            raise ValueError("PF(%d) has no NTT of size %d" % (field.p, size))
+        self.field = field
+        self.size = size
+        p = field.p
+        exptable = field.exptable
+
+        # Slot i of the input goes to slot reverse(i) before the butterflies,
+        # reverse() reversing the bits of the log2(size) bit index
+        bits = size.bit_length() - 1
+        self.reverse = [int(bin(i)[2:].zfill(bits)[::-1], 2) if bits else 0
+                for i in xrange(size)]
+        # The stage that combines transforms of size h into ones of size 2h
+        # multiplies by the powers of a 2h-th root of unity, and the inverse
+        # by the powers of its inverse
+        self.twiddles = []
+        self.inverse_twiddles = []
+        h = 1
+        while h < size:
+            log = field.order // (2 * h)
+            self.twiddles.append([exptable[log * i] for i in xrange(h)])
+            self.inverse_twiddles.append([exptable[(-log * i) % field.order]
+                for i in xrange(h)])
+            h *= 2
+        # The inverse transform is scaled by 1/size
+        self.scale = field.invtable[size % p]
+
+        if numpy is not None:
+            self.npreverse = numpy.array(self.reverse, dtype=numpy.intp)
+            self.nptwiddles = [numpy.array(w, dtype=numpy.int64)
+                    for w in self.twiddles]
+            self.npinverse_twiddles = [numpy.array(w, dtype=numpy.int64)
+                    for w in self.inverse_twiddles]
+
+    @classmethod
+    def get(cls, field, size):
+        """Returns the NTT of the given size over field, built once"""
+        try:
+            return cls.cache[field.p, size]
+        except KeyError:
+            ntt = cls.cache[field.p, size] = cls(field, size)
+            return ntt
+
+    def forward(self, a):
+        """Transforms a, a sequence of up to size ints from 0 to p-1, padded
+        with zeros. Returns a list, or a NumPy int64 array if a is one."""
+        return self._run(a, False)
+
+    def inverse(self, a):
+        """Undoes forward()"""
+        return self._run(a, True)
+
+    def _run(self, a, inverse):
+        p = self.field.p
+        size = self.size
+        if numpy is not None and isinstance(a, numpy.ndarray):
+            x = numpy.zeros(size, dtype=numpy.int64)
+            x[:len(a)] = a
+            x = x[self.npreverse]
+            twiddles = self.npinverse_twiddles if inverse else self.nptwiddles
+            h = 1
+            for w in twiddles:
+                # Pairs of transforms of size h, one pair per row, are
+                # combined into rows of transforms of size 2h. Products stay
+                # below p^2, well within int64.
+                x = x.reshape(-1, 2 * h)
+                u = x[:, :h]
+                v = x[:, h:] * w % p
+                x = numpy.hstack((u + v, u - v)) % p
+                h *= 2
+            x = x.reshape(size)
+            if inverse:
+                x = x * self.scale % p
+            return x
+
+        x = list(a) + [0] * (size - len(a))
+        x = [x[r] for r in self.reverse]
+        twiddles = self.inverse_twiddles if inverse else self.twiddles
+        h = 1
+        for w in twiddles:
+            for start in xrange(0, size, 2 * h):
+                for i in xrange(h):
+                    u = x[start + i]
+                    v = x[start + i + h] * w[i] % p
+                    x[start + i] = (u + v) % p
+                    x[start + i + h] = (u - v) % p
+            h *= 2
+        if inverse:
+            scale = self.scale
+            x = [y * scale % p for y in x]
+        return x
+
+def convolve(a, b, field):
+    """Returns the coefficients of the product of the polynomials with
+    coefficients a and b in field, as a list of len(a) + len(b) - 1 ints.
+    Both are given in the same order, either highest power first or lowest
+    power first, and so is the product. Falls back on the schoolbook method
+    if the product is too long for the field's NTTs."""
+    p = field.p
+    length = len(a) + len(b) - 1
+    size = transform_size(field, length)
+    if size is None:
+        terms = [0] * length
+        for i, x in enumerate(a):
+            if x:
+                for j, y in enumerate(b, i):
+                    terms[j] += x * y
+        return [t % p for t in terms]
+
+    ntt = NTT.get(field, size)
+    if numpy is not None:
+        a = numpy.asarray(a, dtype=numpy.int64)
+        b = numpy.asarray(b, dtype=numpy.int64)
+        product = ntt.inverse(ntt.forward(a) * ntt.forward(b) % p)
+        return product[:length].tolist()
+    A = ntt.forward(a)
+    B = ntt.forward(b)
+    return ntt.inverse([x * y % p for x, y in zip(A, B)])[:length]
+
+def inverse_series(a, count, field):
+    """Returns the first count coefficients of the power series 1/a(x),
+    given the coefficients of a lowest power first, with a[0] non-zero.
+    Newton's iteration b = b * (2 - a*b) doubles the number of correct
+    coefficients of b each time, with convolve() doing the products."""
+    p = field.p
+    b = [field.invtable[a[0]]]
+    size = 1
+    while size < count:
+        size *= 2
+        t = [-x % p for x in convolve(a[:size], b, field)[:size]]
+        t[0] = (t[0] + 2) % p
+        b = convolve(b, t, field)[:size]
+    return b[:count]
+
+class Convolver(object):
+    """Multiplies many sequences by one fixed sequence, with NTTs of a fixed
+    size.
+
+    The transform of fixed is computed once. __call__(a) returns the cyclic
+    convolution of a and fixed over size points, which is the start of the
+    full product, or all of it when size is at least len(a) + len(fixed) - 1.
+    """
+    def __init__(self, fixed, size, field):
+        self.field = field
+        self.ntt = NTT.get(field, size)
+        if numpy is not None:
+            self.npfixed = self.ntt.forward(numpy.array(fixed,
+                dtype=numpy.int64))
+            self.fixed = self.npfixed.tolist()
+        else:
+            self.fixed = self.ntt.forward(fixed)
+
+    def __call__(self, a):
+        """a is a sequence of ints, or a NumPy int64 array in which case the
+        result is one too"""
+        p = self.field.p
+        ntt = self.ntt
+        if numpy is not None and isinstance(a, numpy.ndarray):
+            return ntt.inverse(ntt.forward(a) * self.npfixed % p)
+        A = ntt.forward(a)
+        return ntt.inverse([x * y % p for x, y in zip(A, self.fixed)])
+
+class CodeTransforms(object):
+    """Computes the parity and the syndromes of an (n, k) Reed-Solomon code
+    with generator g over field, in O(n log n) with NTTs.
+
+    Parity is the remainder of m(x)*x^(n-k) divided by g, negated, and the
+    division is done through the reversed polynomials: the quotient,
+    reversed, is the message times the power series inverse of the reversed
+    g, to k terms. The parity is then the low n-k terms of the quotient
+    times g.
+
+    The syndromes S_l = r(α^l) = sum(r_j * α^(jl)) are a chirp transform:
+    with T(m) = m(m-1)/2, jl = T(j+l) - T(j) - T(l), so that S_l is
+    α^-T(l) times the correlation of r_j * α^-T(j) with α^T(m), again a
+    convolution.
+
+    Each block takes two NTTs of the parity convolutions' sizes and one of
+    the syndrome convolution's size, all at most 2n points. supports() tells
+    whether the field has NTTs that long.
+    """
+    def __init__(self, field, n, k, g):
+        self.field = field
+        self.n = n
+        self.k = k
+        p = field.p
+        order = field.order
+        exptable = field.exptable
+
+        # Quotient: the k symbols of the message times the inverse of the
+        # reversed g. g.raw, highest power first, is the reversed g lowest
+        # power first.
+        ginverse = inverse_series(g.raw.tolist(), k, field)
+        self.quotient = Convolver(ginverse, transform_size(field, 2*k - 1),
+                field)
+        # The quotient, lowest power first, times g
+        self.product = Convolver(g.raw[::-1].tolist(),
+                transform_size(field, n), field)
+
+        # The received symbol at index i, the coefficient r_j of x^j for
+        # j = n-1-i, is weighted by α^-T(j). Convolving those, highest power
+        # first, with α^T(m) for m up to 2n-k-1 puts the correlation for S_l
+        # at index n-1+l.
+        def T(m):
+            return m * (m - 1) // 2 % order
+        self.chirp = [exptable[-T(n-1-i) % order] for i in xrange(n)]
+        self.correlation = Convolver([exptable[T(m)] for m in xrange(2*n - k)],
+                transform_size(field, 2*n - k), field)
+        self.unchirp = [exptable[-T(l) % order] for l in xrange(1, n-k+1)]
+        if numpy is not None:
+            self.npchirp = numpy.array(self.chirp, dtype=numpy.int64)
+            self.npunchirp = numpy.array(self.unchirp, dtype=numpy.int64)
+
+    @staticmethod
+    def supports(field, n, k):
+        """Tells whether field has the NTT sizes an (n, k) code needs"""
+        return transform_size(field, max(2*n - k, 2*k - 1, n)) is not None
+
+    def parity(self, m):
+        """Returns the n-k parity symbols for the k message symbols m, as a
+        list of ints"""
+        n = self.n
+        k = self.k
+        if numpy is not None:
+            m = numpy.asarray(m, dtype=numpy.int64)
+            quotient = self.quotient(m)[:k]
+            return self.product(quotient[::-1])[n-k-1::-1].tolist()
+        quotient = self.quotient(m)[:k]
+        return self.product(quotient[::-1])[n-k-1::-1]
+
+    def syndromes(self, symbols):
+        """Returns the n-k syndromes of the n received symbols as a list of
+        ints, S_1 first"""
+        n = self.n
+        k = self.k
+        p = self.field.p
+        if numpy is not None:
+            a = numpy.asarray(symbols, dtype=numpy.int64) * self.npchirp % p
+            c = self.correlation(a)[n:2*n-k]
+            return (c * self.npunchirp % p).tolist()
+        a = [x * w % p for x, w in zip(symbols, self.chirp)]
+        c = self.correlation(a)[n:2*n-k]
+        return [x * w % p for x, w in zip(c, self.unchirp)]
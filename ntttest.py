@@ -0,0 +1,107 @@
+import random
+import unittest
+
+import ntt
+from ffp import PF59int, PrimeField
+from polynomial import Polynomial
+
+class TestNTT(unittest.TestCase):
+    def setUp(self):
+        self.numpy = ntt.numpy
+        self.rand = random.Random(0)
+
+    def tearDown(self):
+        ntt.numpy = self.numpy
+
+    def both(self, check):
+        """Runs check with and without NumPy"""
+        for ntt.numpy in (self.numpy, None):
+            check()
+
+    def test_sizes(self):
+        self.assertEqual(ntt.max_size(PF59int), 2)
+        self.assertEqual(ntt.max_size(PrimeField(257)), 256)
+        self.assertEqual(ntt.max_size(PrimeField(65537)), 65536)
+        self.assertEqual(ntt.transform_size(PrimeField(257), 100), 128)
+        self.assertEqual(ntt.transform_size(PrimeField(257), 257), None)
+        self.assertRaises(ValueError, ntt.NTT, PrimeField(257), 512)
+        self.assertRaises(ValueError, ntt.NTT, PrimeField(257), 6)
+
+    def test_transform(self):
+        """The forward transform evaluates at the powers of a root of unity,
+        and the inverse undoes it"""
+        field = PrimeField(257)
+        P = Polynomial.over(field)
+        def check():
+            for size in (1, 2, 8, 64):
+                transform = ntt.NTT.get(field, size)
+                a = [self.rand.randint(0, 256) for i in xrange(size - 1)]
+                root = field.exptable[field.order // size]
+                # a lowest power first
+                expected = P(a[::-1]).evaluate_many(
+                        [pow(root, i, 257) for i in xrange(size)])
+                if ntt.numpy is not None:
+                    A = transform.forward(ntt.numpy.array(a))
+                    self.assertEqual(A.tolist(), expected)
+                    self.assertEqual(transform.inverse(A).tolist(),
+                            a + [0])
+                A = transform.forward(a)
+                self.assertEqual(A, expected)
+                self.assertEqual(transform.inverse(A), a + [0])
+        self.both(check)
+
+    def test_convolve(self):
+        """Products agree with the schoolbook Polynomial.__mul__, including
+        ones too long for the field's transforms"""
+        def check():
+            for p, la, lb in ((257, 50, 70), (257, 200, 100),
+                    (65537, 1, 300), (65537, 100, 100)):
+                field = PrimeField(p)
+                a = [self.rand.randint(0, p-1) for i in xrange(la)]
+                b = [self.rand.randint(0, p-1) for i in xrange(lb)]
+                expected = [0] * (la + lb - 1)
+                for i, x in enumerate(a):
+                    for j, y in enumerate(b):
+                        expected[i+j] = (expected[i+j] + x * y) % p
+                self.assertEqual(ntt.convolve(a, b, field), expected)
+        self.both(check)
+
+    def test_inverse_series(self):
+        field = PrimeField(65537)
+        def check():
+            a = [self.rand.randint(1, 65536) for i in xrange(40)]
+            b = ntt.inverse_series(a, 100, field)
+            self.assertEqual(len(b), 100)
+            self.assertEqual(ntt.convolve(a, b, field)[:100], [1] + [0] * 99)
+        self.both(check)
+
+    def test_code(self):
+        """CodeTransforms give the same parity and syndromes as polynomial
+        division and evaluation"""
+        def check():
+            for p, n, k in ((65537, 100, 80), (65537, 300, 299),
+                    (257, 100, 60)):
+                field = PrimeField(p)
+                P = Polynomial.over(field)
+                alpha = field(field.generator)
+                g = P((1,))
+                for i in xrange(1, n-k+1):
+                    g = g * P((1, -alpha**i))
+                self.assertTrue(ntt.CodeTransforms.supports(field, n, k))
+                transforms = ntt.CodeTransforms(field, n, k, g)
+
+                m = [self.rand.randint(0, p-1) for i in xrange(k)]
+                remainder = (P(m) * P(x0=1).shift(n-k)) % g
+                parity = [-c % p for c in remainder.raw]
+                parity = [0] * (n-k-len(parity)) + parity
+                self.assertEqual(transforms.parity(m), parity)
+
+                r = [self.rand.randint(0, p-1) for i in xrange(n)]
+                self.assertEqual(transforms.syndromes(r),
+                        P(r).evaluate_many(alpha**l for l in xrange(1, n-k+1)))
+                self.assertEqual(transforms.syndromes(m + parity), [0] * (n-k))
+        self.both(check)
+        self.assertFalse(ntt.CodeTransforms.supports(PrimeField(257), 255, 223))
+
+if __name__ == "__main__":
+    unittest.main()
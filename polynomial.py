@@ -1,20 +1,51 @@
 # Copyright (c) 2010 Andrew Brown <brownan@cs.duke.edu, brownan@gmail.com>
 # See LICENSE.txt for license terms
 
+from array import array
+from itertools import imap
+from operator import mul
 from StringIO import StringIO
-from ffp import PF59int
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ffp import PF59int, PrimeField
+from ntt import convolve, transform_size
+
+# evaluate_many() uses NumPy for at least this many points
+NUMPY_POINTS = 8
+
+# __mul__ multiplies with NTTs, in fields that have them, when both
+# polynomials have at least this many terms, or NTT_TERMS_PYTHON without
+# NumPy
+NTT_TERMS = 32
+NTT_TERMS_PYTHON = 128
 
 class Polynomial(object):
-    """Completely general polynomial class.
-    
-    Polynomial objects are immutable.
-    
-    Implementation note: while this class is mostly agnostic to the type of
-    coefficients used (as long as they support the usual mathematical
-    operations), the Polynomial class still assumes the additive identity and
-    multiplicative identity are 0 and 1 respectively. If you're doing math over
-    some strange field or using non-numbers as coefficients, this class will
-    need to be modified."""
+    """Polynomial with coefficients in PF(59), or in another prime field for
+    the classes returned by Polynomial.over().
+
+    Coefficients are stored as plain ints in the range 0 to p-1 in a compact
+    array of the field's typecode, array('B') for PF(59), available as the
+    raw attribute, in order of decreasing power. The coefficients attribute
+    gives the same coefficients as a tuple of field elements.
+
+    Polynomial objects are immutable, except through the in-place methods
+    iadd(), isub(), iscale() and ishift(), so += and -= still make new
+    polynomials. Don't use those methods on a polynomial you don't own, or
+    one that is being used as a dictionary key.
+    Arithmetic works on the raw ints using the tables of the field where it
+    has them, and the modular reduction in __mul__ and evaluate() is only
+    done once per coefficient at the end rather than once per term.
+    Polynomials over different fields can't be mixed."""
+    __slots__ = ('raw',)
+
+    # The field of the coefficients, and the array typecode that holds them
+    field = PF59int
+    typecode = PF59int.typecode
+
     def __init__(self, coefficients=(), **sparse):
         """
         There are three ways to initialize a Polynomial object.
@@ -27,6 +58,9 @@ class Polynomial(object):
         3) With no arguments, creates an empty polynomial, equivalent to
         Polynomial((0,))
 
+        Coefficients may be field elements or plain ints, which are reduced
+        modulo p.
+
         >>> print Polynomial((5, 0, 0, 0, 0, 0))
         5x^5
 
@@ -39,68 +73,153 @@ class Polynomial(object):
         if coefficients and sparse:
             raise TypeError("Specify coefficients list /or/ keyword terms, not"
                     " both")
+        p = self.field.p
         if coefficients:
             # Polynomial((1, 2, 3, ...))
-            c = list(coefficients)
-            # Expunge any leading 0 coefficients
-            while c and c[0] == 0:
-                c.pop(0)
-            if not c:
-                c.append(0)
-
-            self.coefficients = tuple(c)
+            c = array(self.typecode, [int(x) % p for x in coefficients])
         elif sparse:
             # Polynomial(x32=...)
-            powers = sparse.keys()
-            powers.sort(reverse=1)
-            # Not catching possible exceptions from the following line, let
+            powers = [int(power[1:]) for power in sparse]
+            # Not catching possible exceptions from the above line, let
             # them bubble up.
-            highest = int(powers[0][1:])
-            coefficients = [0] * (highest+1)
+            highest = max(powers)
+            c = array(self.typecode, [0]) * (highest+1)
 
             for power, coeff in sparse.iteritems():
                 power = int(power[1:])
-                coefficients[highest - power] = coeff
-
-            self.coefficients = tuple(coefficients)
+                c[highest - power] = int(coeff) % p
         else:
             # Polynomial()
-            self.coefficients = (0,)
+            c = array(self.typecode, [0])
+
+        self.raw = _strip(c)
+
+    @staticmethod
+    def over(field):
+        """Returns the Polynomial class for coefficients in field, a class
+        returned by ffp.PrimeField(). Each field gets one subclass, made on
+        first use, and PF(59) gets Polynomial itself."""
+        try:
+            return _classes[field.p]
+        except KeyError:
+            pass
+        cls = type("Polynomial", (Polynomial,), {
+            '__slots__': (),
+            'field': field,
+            'typecode': field.typecode,
+            })
+        _classes[field.p] = cls
+        return cls
+
+    @classmethod
+    def _new(cls, raw):
+        """Wraps an array of the class's typecode holding already reduced
+        coefficients without copying it"""
+        self = object.__new__(cls)
+        self.raw = _strip(raw)
+        return self
+
+    def __reduce__(self):
+        return (_unpickle, (self.field.p, self.raw.tolist()))
+
+    @property
+    def coefficients(self):
+        """The coefficients as a tuple of field elements, highest power
+        first"""
+        return tuple(map(self.field.elements.__getitem__, self.raw))
 
     def __len__(self):
         """Returns the number of terms in the polynomial"""
-        return len(self.coefficients)
+        return len(self.raw)
     def degree(self):
         """Returns the degree of the polynomial"""
-        return len(self.coefficients) - 1
-
-    def __add__(self, other):
-        diff = len(self) - len(other)
-        if diff > 0:
-            t1 = self.coefficients
-            t2 = (0,) * diff + other.coefficients
+        return len(self.raw) - 1
+
+    def _combine(self, other, sign):
+        """Returns an array holding s + sign*o for each pair of aligned
+        coefficients s of self and o of other, sign being 1 or -1"""
+        a = self.raw
+        b = other.raw
+        c = array(self.typecode, [0]) * (len(b) - len(a)) + a
+        off = len(c) - len(b)
+        table = self.field.addtable if sign > 0 else self.field.subtable
+        if table is not None:
+            for i, y in enumerate(b, off):
+                c[i] = table[c[i]][y]
         else:
-            t1 = (0,) * (-diff) + self.coefficients
-            t2 = other.coefficients
-
-        return self.__class__(x+y for x,y in zip(t1, t2))
+            p = self.field.p
+            for i, y in enumerate(b, off):
+                c[i] = (c[i] + sign*y) % p
+        return c
 
-    def __neg__(self):
-        return self.__class__(-x for x in self.coefficients)
+    def __add__(self, other):
+        return self._new(self._combine(other, 1))
     def __sub__(self, other):
-        return self + -other
-            
-    def __mul__(self, other):
-        terms = [0] * (len(self) + len(other))
+        return self._new(self._combine(other, -1))
+    def __neg__(self):
+        p = self.field.p
+        return self._new(array(self.typecode, [-x % p for x in self.raw]))
+
+    def iadd(self, other):
+        """Adds other to this polynomial in place"""
+        self.raw = _strip(self._combine(other, 1))
+        return self
+    def isub(self, other):
+        """Subtracts other from this polynomial in place"""
+        self.raw = _strip(self._combine(other, -1))
+        return self
+
+    def scale(self, c):
+        """Returns this polynomial multiplied by the scalar c"""
+        return self._new(array(self.typecode, self.raw)).iscale(c)
+    def iscale(self, c):
+        """Multiplies this polynomial by the scalar c in place"""
+        p = self.field.p
+        c = int(c) % p
+        raw = self.raw
+        for i, x in enumerate(raw):
+            raw[i] = x * c % p
+        _strip(raw)
+        return self
+
+    def shift(self, n):
+        """Returns this polynomial multiplied by x^n. A negative n divides by
+        x^-n, dropping the lowest terms."""
+        return self._new(array(self.typecode, self.raw)).ishift(n)
+    def ishift(self, n):
+        """Multiplies this polynomial by x^n in place. A negative n divides by
+        x^-n, dropping the lowest terms."""
+        raw = self.raw
+        if n > 0:
+            if raw[0]:
+                raw.extend(array(self.typecode, [0]) * n)
+        elif n < 0:
+            del raw[n:]
+            if not raw:
+                raw.append(0)
+        return self
 
-        for i1, c1 in enumerate(reversed(self.coefficients)):
+    def __mul__(self, other):
+        b = other.raw
+        length = len(self.raw) + len(b) - 1
+        threshold = NTT_TERMS if numpy is not None else NTT_TERMS_PYTHON
+        if min(len(self.raw), len(b)) >= threshold and \
+                transform_size(self.field, length) is not None:
+            # Long products in fields like PF(65537) go through NTTs
+            return self._new(array(self.typecode,
+                convolve(self.raw, b, self.field)))
+
+        terms = [0] * length
+
+        for i1, c1 in enumerate(self.raw):
             if c1 == 0:
                 # Optimization
                 continue
-            for i2, c2 in enumerate(reversed(other.coefficients)):
-                terms[i1+i2] += c1*c2
+            for i2, c2 in enumerate(b, i1):
+                terms[i2] += c1*c2
 
-        return self.__class__(reversed(terms))
+        p = self.field.p
+        return self._new(array(self.typecode, [t % p for t in terms]))
 
     def __floordiv__(self, other):
         return divmod(self, other)[0]
@@ -108,53 +227,57 @@ class Polynomial(object):
         return divmod(self, other)[1]
 
     def __divmod__(dividend, divisor):
-        """Implements polynomial long-division recursively. I know this is
-        horribly inefficient, no need to rub it in. I know it can even throw
-        recursion depth errors on some versions of Python.
-
-        However, not being a math person myself, I implemented this from my
-        memory of how polynomial long division works. It's straightforward and
-        doesn't do anything fancy. There's no magic here.
+        """Implements polynomial long-division as an iterative synthetic
+        division, in O(deg(dividend) * deg(divisor)) with no intermediate
+        polynomials.
+
+        The dividend coefficients are copied to a list of plain ints and each
+        quotient coefficient, once found, has the divisor subtracted out of
+        the terms below it. The modular reduction of each term is deferred
+        until that term is reached. The inverse of the divisor's leading
+        coefficient is looked up once, and is skipped entirely for monic
+        divisors such as an RS generator polynomial.
         """
         class_ = dividend.__class__
-
-        # See how many times the highest order term
-        # of the divisor can go into the highest order term of the dividend
-
-        dividend_power = dividend.degree()
-        dividend_coefficient = dividend.coefficients[0]
-
-        divisor_power = divisor.degree()
-        divisor_coefficient = divisor.coefficients[0]
-
-        quotient_power = dividend_power - divisor_power
-        if quotient_power < 0:
+        p = class_.field.p
+        typecode = class_.typecode
+        d = divisor.raw
+        lead = d[0]
+        if not lead:
+            raise ZeroDivisionError("Polynomial division by zero")
+
+        out = dividend.raw.tolist()
+        quotient_len = len(out) - len(d) + 1
+        if quotient_len <= 0:
             # Doesn't divide at all, return 0 for the quotient and the entire
-            # dividend as the remainder
-            return class_((PF59int(0),)), dividend
-
-        # Compute how many times the highest order term in the divisor goes
-        # into the dividend
-        quotient_coefficient = dividend_coefficient / divisor_coefficient
-        quotient = class_( (quotient_coefficient,) + (0,) * quotient_power )
-
-        remander = dividend - quotient * divisor
-
-        if remander.coefficients == (0,):
-            # Goes in evenly with no remainder, we're done
-            return quotient, remander
-
-        # There was a remainder, see how many times the remainder goes into the
-        # divisor
-        morequotient, remander = divmod(remander, divisor)
-        return quotient + morequotient, remander
+            # dividend as the remainder, copied so it isn't shared
+            return (class_._new(array(typecode, [0])),
+                    class_._new(array(typecode, dividend.raw)))
+
+        # Negated divisor coefficients below the leading one, so that each
+        # step is a multiply-add
+        negd = [(-c) % p for c in d[1:]]
+        inverse = class_.field.invtable[lead]
+
+        for i in xrange(quotient_len):
+            coef = out[i] % p
+            if inverse != 1:
+                coef = coef * inverse % p
+            out[i] = coef
+            if coef:
+                for j, c in enumerate(negd, i+1):
+                    out[j] += coef * c
+
+        quotient = array(typecode, out[:quotient_len])
+        remainder = array(typecode, [x % p for x in out[quotient_len:]])
+        return class_._new(quotient), class_._new(remainder)
 
     def __eq__(self, other):
-        return self.coefficients == other.coefficients
+        return self.raw == other.raw
     def __ne__(self, other):
-        return self.coefficients != other.coefficients
+        return self.raw != other.raw
     def __hash__(self):
-        return hash(self.coefficients)
+        return hash(self.raw.tostring())
 
     def __repr__(self):
         n = self.__class__.__name__
@@ -162,7 +285,7 @@ class Polynomial(object):
     def __str__(self):
         buf = StringIO()
         l = len(self) - 1
-        for i, c in enumerate(self.coefficients):
+        for i, c in enumerate(self.raw):
             if not c and i > 0:
                 continue
             power = l - i
@@ -179,23 +302,140 @@ class Polynomial(object):
 
     def evaluate(self, x):
         "Evaluate this polynomial at value x, returning the result."
-        # Holds the sum over each term in the polynomial
-        c = PF59int(0)
+        field = self.field
+        x = int(x) % field.p
+
+        # Holds the sum over each term in the polynomial, reduced at the end
+        c = 0
 
         # Holds the current power of x. This is multiplied by x after each term
         # in the polynomial is added up. Initialized to x^0 = 1
-        p = PF59int(1)
+        p = 1
+
+        if field.multable is not None:
+            # Row of the multiplication table for x, to step through its
+            # powers
+            row = field.multable[x]
+            for term in reversed(self.raw):
+                c += term * p
+                p = row[p]
+        else:
+            for term in reversed(self.raw):
+                c += term * p
+                p = p * x % field.p
 
-        for term in reversed(self.coefficients):
-            c = c + term * p
+        return field.elements[c % field.p]
 
-            p = p * x
+    def evaluate_many(self, points):
+        """Evaluates this polynomial at each of points, returning a list of
+        field elements.
 
-        return c
+        Each point is a dot product of the coefficients with a row of the
+        field's powtable, the powers of that point, reduced once at the end.
+        With NumPy and enough points, all of them are one matrix-vector
+        product instead. Fields too large for a powtable use Horner's rule,
+        stepping all of the points at once with NumPy.
+        """
+        p = self.field.p
+        values = self._evaluate([int(x) % p for x in points])
+        return map(self.field.elements.__getitem__, values)
+
+    def evaluate_all(self):
+        """Evaluates this polynomial at every element of the field,
+        returning a list of p field elements indexed by the point"""
+        return map(self.field.elements.__getitem__, self._evaluate(None))
+
+    def _evaluate(self, points):
+        """Does the work for evaluate_many() and evaluate_all() on plain
+        ints. points is a list of ints from 0 to p-1, or None for all of
+        them in order."""
+        field = self.field
+        p = field.p
+        order = field.order
+        use_numpy = numpy is not None and (points is None or
+                len(points) >= NUMPY_POINTS)
+
+        if field.powtable is None:
+            c = self.raw.tolist()
+            if use_numpy:
+                x = numpy.arange(p) if points is None else numpy.array(points)
+                # Products stay below p^2, well within int64
+                x = x.astype(numpy.int64)
+                v = numpy.zeros(len(x), dtype=numpy.int64)
+                for term in c:
+                    v = (v * x + term) % p
+                return v.tolist()
+            if points is None:
+                points = xrange(p)
+            values = []
+            for x in points:
+                v = 0
+                for term in c:
+                    v = (v * x + term) % p
+                values.append(v)
+            return values
+
+        # Lowest power first. Every non-zero x has x^order = 1, so terms of
+        # higher powers fold onto the lower ones, except at x = 0.
+        c = self.raw[::-1].tolist()
+        if len(c) > order:
+            for i in xrange(order, len(c)):
+                c[i % order] += c[i]
+            del c[order:]
+
+        if use_numpy:
+            powers = _nppowers(field)
+            if points is not None:
+                powers = powers[points]
+            values = (numpy.dot(powers[:, :len(c)], c) % p).tolist()
+        else:
+            powtable = field.powtable
+            if points is None:
+                points = xrange(p)
+            values = [sum(imap(mul, c, powtable[x])) % p for x in points]
+
+        if len(self.raw) > order:
+            for i, x in enumerate(points if points is not None
+                    else xrange(p)):
+                if not x:
+                    values[i] = self.raw[-1]
+        return values
 
     def get_coefficient(self, degree):
         """Returns the coefficient of the specified term"""
         if degree > self.degree():
-            return 0
+            return self.field.elements[0]
         else:
-            return self.coefficients[-(degree+1)]
+            return self.field.elements[self.raw[-(degree+1)]]
+
+# Maps primes to the Polynomial classes of their fields, see
+# Polynomial.over()
+_classes = {PF59int.p: Polynomial}
+
+def _unpickle(p, coefficients):
+    return Polynomial.over(PrimeField(p))(coefficients)
+
+# Maps primes to the powtables of their fields as NumPy arrays
+_powers = {}
+
+def _nppowers(field):
+    """field.powtable as a NumPy int64 array, built on first use"""
+    try:
+        return _powers[field.p]
+    except KeyError:
+        powers = _powers[field.p] = numpy.array(field.powtable,
+                dtype=numpy.int64)
+        return powers
+
+def _strip(c):
+    """Expunges any leading 0 coefficients from the array c in place, leaving
+    at least one coefficient, and returns it"""
+    i = 0
+    end = len(c) - 1
+    while i < end and not c[i]:
+        i += 1
+    if i:
+        del c[:i]
+    elif not c:
+        c.append(0)
+    return c
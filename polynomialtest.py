@@ -1,7 +1,8 @@
+import pickle
 import unittest
 
 from polynomial import Polynomial
-from ffp import PF59int
+from ffp import PF59int, PrimeField
 
 class TestPFPoly(unittest.TestCase):
     """Tests that the Polynomial class works when given GF256int objects
@@ -21,6 +22,113 @@ class TestPFPoly(unittest.TestCase):
         r = one - two
         self.assertEqual(r.coefficients, (PF59int(54),PF59int(56),PF59int(7),PF59int(2),PF59int(58),PF59int(52)))
 
+    def test_mul(self):
+        one = Polynomial(map(PF59int,     (8,3,5,1)))
+        two = Polynomial(map(PF59int, (5,3,1,1,6,8)))
+        r = one * two
+        self.assertEqual(r.coefficients, (40,39,42,31,0,29,55,46,8))
+
+    def test_evaluate(self):
+        one = Polynomial(map(PF59int, (8,3,5,1)))
+        for x in xrange(59):
+            self.assertEqual(one.evaluate(PF59int(x)),
+                    (8*x**3 + 3*x**2 + 5*x + 1) % 59)
+
+    def test_evaluate_many(self):
+        """Multipoint evaluation agrees with evaluate(), with and without
+        NumPy, including polynomials longer than the field"""
+        import polynomial
+        numpy = polynomial.numpy
+        try:
+            for polynomial.numpy in (numpy, None):
+                for p in (Polynomial((8,3,5,1)), Polynomial((0,)),
+                        Polynomial((i * 7 + 3) % 59 for i in xrange(130))):
+                    expected = [p.evaluate(x) for x in xrange(59)]
+                    self.assertEqual(p.evaluate_all(), expected)
+                    points = [0, 5, PF59int(58), 5, 1, 0, 2, 30, 100]
+                    self.assertEqual(p.evaluate_many(points),
+                            [p.evaluate(x) for x in points])
+                    self.assertEqual(p.evaluate_many(points[:3]),
+                            [p.evaluate(x) for x in points[:3]])
+                    self.assertTrue(isinstance(p.evaluate_all()[3], PF59int))
+                    self.assertEqual(p.evaluate_many([]), [])
+        finally:
+            polynomial.numpy = numpy
+
+    def test_over(self):
+        """Polynomials over other fields do their arithmetic modulo p, with
+        or without the field's tables and NumPy"""
+        import polynomial
+        numpy = polynomial.numpy
+        self.assertTrue(Polynomial.over(PF59int) is Polynomial)
+        try:
+            for polynomial.numpy in (numpy, None):
+                for p in (257, 65537):
+                    P = Polynomial.over(PrimeField(p))
+                    self.assertTrue(Polynomial.over(PrimeField(p)) is P)
+                    one = P((p-1, 3, 5, 1))
+                    two = P((5, 3, 1, 1, 6, p+8))
+                    self.assertEqual(one.raw.typecode, P.field.typecode)
+                    self.assertEqual((one + two).coefficients,
+                            (5, 3, 0, 4, 11, 9))
+                    self.assertEqual((one - one).coefficients, (0,))
+                    self.assertEqual((-one).coefficients, (1, p-3, p-5, p-1))
+                    self.assertTrue(isinstance(two.coefficients[0], P.field))
+                    self.assertEqual(one.scale(2), one * P((2,)))
+
+                    q, r = divmod(two * one + P((7, 1)), P((2,)) * one)
+                    self.assertEqual(q, two * P((P.field(2).inverse(),)))
+                    self.assertEqual(r, P((7, 1)))
+
+                    for x in (0, 1, 2, p-1, 1000 % p):
+                        self.assertEqual(one.evaluate(x),
+                                ((p-1)*x**3 + 3*x**2 + 5*x + 1) % p)
+                    points = range(0, p, p // 20)
+                    self.assertEqual(two.evaluate_many(points),
+                            [two.evaluate(x) for x in points])
+                    self.assertEqual(pickle.loads(pickle.dumps(two)), two)
+        finally:
+            polynomial.numpy = numpy
+
+    def test_strip(self):
+        """Leading zeros are dropped, but a zero polynomial keeps one term"""
+        self.assertEqual(Polynomial((0,0,0,5,1)).coefficients, (5,1))
+        self.assertEqual(Polynomial((0,0)).coefficients, (0,))
+        self.assertEqual(Polynomial((59,118,3)).coefficients, (3,))
+        self.assertEqual(Polynomial(x3=5, x0=2).coefficients, (5,0,0,2))
+
+    def test_inplace(self):
+        one = Polynomial(map(PF59int,     (1,3,5,1)))
+        two = Polynomial(map(PF59int, (5,3,58,1,6,8)))
+
+        r = Polynomial(one.coefficients)
+        self.assertTrue(r.iadd(two) is r)
+        self.assertEqual(r, one + two)
+        r.isub(two)
+        self.assertEqual(r, one)
+        r.isub(one)
+        self.assertEqual(r.coefficients, (0,))
+
+        # += and -= make new polynomials, leaving shared ones alone
+        r = one
+        r += two
+        self.assertEqual(one.coefficients, (1,3,5,1))
+        r -= r
+        self.assertEqual(r.coefficients, (0,))
+        self.assertEqual(one.coefficients, (1,3,5,1))
+
+        r = Polynomial(two.coefficients)
+        self.assertTrue(r.iscale(3) is r)
+        self.assertEqual(r, two * Polynomial((3,)))
+        self.assertEqual(r, two.scale(3))
+
+        r = Polynomial(one.coefficients)
+        r.ishift(3)
+        self.assertEqual(r, one * Polynomial(x3=1))
+        self.assertEqual(r, one.shift(3))
+        r.ishift(-5)
+        self.assertEqual(r.coefficients, (1,3))
+
     def da_test_mul(self):
         one = Polynomial(map(PF59int,     (8,3,5,1)))
         two = Polynomial(map(PF59int, (5,3,1,1,6,8)))
@@ -37,6 +145,26 @@ class TestPFPoly(unittest.TestCase):
         # Make sure they multiply back out okay
         self.assertEqual(q*one + r, two)
 
+    def test_div_long(self):
+        """Long divisions by monic and non-monic divisors multiply back out,
+        without hitting any recursion limit"""
+        dividend = Polynomial((i * 7 + 3) % 59 for i in xrange(2000))
+        for divisor in (Polynomial((1,5,0,17,58)), Polynomial((13,5,0,17,58)),
+                Polynomial((42,)), Polynomial(dividend.coefficients)):
+            q, r = divmod(dividend, divisor)
+            self.assertTrue(r.degree() < divisor.degree() or
+                    r.coefficients == (0,))
+            self.assertEqual(q*divisor + r, dividend)
+            self.assertEqual(q, dividend // divisor)
+            self.assertEqual(r, dividend % divisor)
+
+        a = Polynomial((1,2))
+        q, r = divmod(a, Polynomial((1,2,3)))
+        self.assertEqual(q.coefficients, (0,))
+        self.assertEqual(r.coefficients, (1,2))
+        r.ishift(1)
+        self.assertEqual(a.coefficients, (1,2))
+
     def da_test_div_scalar(self):
         """Tests division by a scalar"""
         numbers = map(GF256int, (5,20,50,100,134,158,0,148,233,254,4,5,2))
@@ -2,7 +2,23 @@
 # Copyright (c) 2010 Andrew Brown <brownan@cs.duke.edu, brownan@gmail.com>
 # See LICENSE.txt for license terms
 # Yo Ho Yo Ho, A pirate's life for me!
-from ffp import PF59int
+import marshal
+import os
+import sys
+import time
+from array import array
+from collections import deque
+from itertools import chain, imap, islice, izip
+from operator import getitem, mul
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ffp import PF59int, PrimeField
+from interleave import _groups, deinterleave, interleave
+from ntt import CodeTransforms
 from polynomial import Polynomial
 
 """This module implements Reed-Solomon Encoding.
@@ -16,72 +32,686 @@ to k bytes per block to avoid problems. Also see the nostrip option to
 decode().
 
 When called as a script, this file encodes data from standard in and outputs it
-to standard out, using the standard RS code 255,223. This is suitable for
-encoding text and trying it out, but don't try to encode binary data with it!
+to standard out, using the RS code 58,46 over the base 58 alphabet. This is
+suitable for encoding text in that alphabet and trying it out.
 
-When encoding, it outputs blocks of 255 bytes, 223 of them are data (padded
-with leading null bytes if necessary) and then 32 bytes of parity data.
+When encoding, it outputs blocks of 58 symbols, 46 of them are data (padded
+with leading "0" if necessary) and then 12 symbols of parity data. Line
+breaks in the input are skipped, and any other character outside the alphabet
+stops the encoder with an error message.
 
 Use the -d flag to decode data on standard in to standard out. This reads in
-blocks of 255 bytes, and outputs the decoded data from them. If there are less
-than 16 errors per block, your data will be recovered.
+blocks of 58 symbols, and outputs the decoded data from them. If there are no
+more than 6 errors per block, your data will be recovered. Characters outside
+the alphabet, such as line breaks, count as erasures, and blocks that can't be
+decoded are passed through as received and counted as failed.
+
+Input is read and written in large buffered chunks. Use -n and -k to pick
+another code, -j to spread the blocks over several worker processes (output
+stays in order), and -h for the other options. Throughput and, when decoding,
+counts of corrected and failed blocks are reported on standard error.
+
+With -D, codewords are interleaved in groups of that many, so bursts of errors
+are spread over the group, see the interleave module. Data has to be decoded
+with the same -D it was encoded with.
 """
+class AlphabetError(ValueError):
+    """Raised when a string has characters outside an Alphabet. positions
+    lists the index of every such character in the string, or for the batch
+    methods of RSCoder, a (block index, index in the block) pair for every
+    such character in the batch."""
+    def __init__(self, positions):
+        ValueError.__init__(self, "Invalid characters at positions %s" %
+                ", ".join(map(str, positions)))
+        self.positions = positions
+
+    def __reduce__(self):
+        # So that errors from worker processes keep their positions
+        return (AlphabetError, (self.positions,))
+
+class Alphabet(object):
+    """Converts whole blocks between strings and symbols, the integers mod 59.
+
+    chars is a string of the 59 characters used for symbols 0 to 58. The
+    character for symbol 0 is also used as padding, see BASE58 for the
+    default alphabet. Conversions go through 256 entry str.translate tables
+    in both directions, so they run at C speed, and symbols come back as a
+    compact array('B'). unicode strings can't use the tables, and are
+    converted a character at a time instead.
+    """
+    def __init__(self, chars):
+        if len(chars) != 59 or len(set(chars)) != 59:
+            raise ValueError("An alphabet needs 59 distinct characters")
+        self.chars = chars
+        self.pad = chars[0]
+        # Maps characters to symbols
+        self.lookup = dict((c, i) for i, c in enumerate(chars))
+
+        # Translation tables: characters to symbol bytes, with "\xff" for
+        # characters outside the alphabet, and symbol bytes to characters
+        table = ["\xff"] * 256
+        for i, c in enumerate(chars):
+            table[ord(c)] = chr(i)
+        self.symboltable = "".join(table)
+        self.chartable = chars + "\0" * (256 - 59)
+
+    def _translate(self, s):
+        """Returns the symbols of s as a byte string, with "\xff" for
+        characters outside the alphabet"""
+        if isinstance(s, unicode):
+            lookup = self.lookup
+            return "".join(chr(lookup.get(c, 255)) for c in s)
+        return s.translate(self.symboltable)
+
+    def to_symbols(self, s):
+        """Converts the string s to an array('B') of symbols. Raises
+        AlphabetError, listing every invalid character, if s has any."""
+        symbols = self._translate(s)
+        if "\xff" in symbols:
+            raise AlphabetError(self.invalid(s))
+        return array('B', symbols)
+
+    def invalid(self, s):
+        """Returns the positions of the characters of s that are not in this
+        alphabet"""
+        symbols = self._translate(s)
+        return [i for i, c in enumerate(symbols) if c == "\xff"]
+
+    def to_string(self, symbols):
+        """Converts a sequence of symbols (a list of ints, array('B'),
+        bytearray or a byte string) back to a string"""
+        symbols = bytearray(symbols)
+        if symbols and max(symbols) > 58:
+            raise ValueError("Symbols must be in the range 0 to 58")
+        return str(symbols).translate(self.chartable)
+
+    def bytes_to_symbols(self, b):
+        """Converts the characters in b, any buffer of bytes, to a bytearray
+        of symbols without making a str. Raises AlphabetError like
+        to_symbols()."""
+        symbols = bytearray(b).translate(self.symboltable)
+        if 255 in symbols:
+            raise AlphabetError([i for i, c in enumerate(symbols) if c == 255])
+        return symbols
+
+    def symbols_to_bytes(self, symbols):
+        """Converts symbols, any buffer of bytes from 0 to 58, to a
+        bytearray of characters"""
+        return bytearray(symbols).translate(self.chartable)
+
+# The bitcoin base 58 alphabet, with "0" added as the 59th character for
+# symbol 0 and used as whitespace. O, I and l are excluded because they
+# degrade readability. Use Alphabet("\0" + BASE58.chars[1:]) to pad with
+# null bytes instead.
+BASE58 = Alphabet("0123456789abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ")
+
 def b58conv(C):
     """This Function converts characters in the bitcoin Base 58 into integers mod 59
     The 0 character is used as whitespace it can be replaced with \0 if desired 0 was
-    chosen simply because it does not appear in bitcoin addresses"""
-    alph=['0','1','2','3','4','5','6','7','8','9','a','b','c','d','e','f','g','h','i','j','k','m','n','o','p','q','r','s','t','u','v','w','x','y','z','A','B','C','D','E','F','G','H','J','K','L','M','N','P','Q','R','S','T','U','V','W','X','Y','Z']
-    if C in alph:
-        return alph.index(C)
-    return 101
+    chosen simply because it does not appear in bitcoin addresses
+
+    Returns 101 for characters outside the alphabet. To convert whole strings,
+    use BASE58.to_symbols() instead."""
+    return BASE58.lookup.get(C, 101)
 def r58conv(N):
     """This function performs the reverse operation to b58conv taking integers mod
     59 to characters in the bitcoin base 58 alphabet"""
-    alphabet=['0','1','2','3','4','5','6','7','8','9','a','b','c','d','e','f','g','h','i','j','k','m','n','o','p','q','r','s','t','u','v','w','x','y','z','A','B','C','D','E','F','G','H','J','K','L','M','N','P','Q','R','S','T','U','V','W','X','Y','Z']
-    return alphabet[N]
+    return BASE58.chars[N]
+
+# Block statuses yielded by RSCoder.decode_many
+CLEAN = "clean"
+CORRECTED = "corrected"
+FAILED = "failed"
+
+class DecodeResult(object):
+    """The outcome of decoding one block, see RSCoder.decode_result().
+
+    status is CLEAN, CORRECTED or FAILED. positions lists the indexes of the
+    corrected symbols in the codeword, in increasing order, and magnitudes
+    how far off, mod p, each one was as received, None for an erased
+    character that wasn't in the alphabet. Erasures that were received
+    right aren't corrections. Both are empty for a clean block and
+    None for a failed one. symbols holds the n corrected symbols, or the
+    received ones, with any erasures set to 0, if decoding failed. The
+    message and codeword strings are only built when they are first asked
+    for.
+    """
+    __slots__ = ('status', 'positions', 'magnitudes', 'symbols', '_coder',
+            '_received', '_nostrip', '_message')
+
+    def __init__(self, coder, received, symbols, corrections, nostrip=False):
+        self._coder = coder
+        self._received = received
+        self._nostrip = nostrip
+        self._message = None
+        self.symbols = symbols
+        if corrections is None:
+            self.status = FAILED
+            self.positions = self.magnitudes = None
+        elif not corrections[0]:
+            self.status = CLEAN
+            self.positions = self.magnitudes = ()
+        else:
+            self.status = CORRECTED
+            # Positions are powers of x, 0 being the last symbol
+            n = coder.n
+            fixes = sorted((n-1-j, y) for j, y in izip(*corrections))
+            self.positions = tuple(i for i, y in fixes)
+            self.magnitudes = tuple(y for i, y in fixes)
+
+    @property
+    def errors(self):
+        """The number of symbols corrected, None if decoding failed"""
+        if self.positions is None:
+            return None
+        return len(self.positions)
+
+    @property
+    def message(self):
+        """The message, as decode() would return it"""
+        if self._message is None:
+            coder = self._coder
+            if self.status == FAILED:
+                self._message = coder._as_received(self._received,
+                        self._nostrip)
+            else:
+                self._message = coder._strip(
+                        coder._from_symbols(self.symbols[:coder.k]),
+                        self._nostrip)
+        return self._message
+
+    @property
+    def codeword(self):
+        """The corrected codeword as a string of n characters, or an array
+        of n symbols for a coder without an alphabet"""
+        return self._coder._from_symbols(self.symbols)
+
+class DecodeStats(object):
+    """Counters kept by an RSCoder created with instrument=True.
+
+    time and calls hold the total wall time and number of calls of each
+    decoder stage, blocks the number of blocks decoded with each status,
+    errors a histogram of the number of symbols corrected in corrected
+    blocks, and positions a histogram of the string indexes they were at.
+    """
+    stages = ("decode", "syndromes", "single_error", "berlekamp_massey",
+            "euclid", "chien_search", "forney")
+
+    def __init__(self):
+        self.time = {}
+        self.calls = {}
+        self.blocks = {}
+        self.errors = {}
+        self.positions = {}
+        self.reset()
+
+    def reset(self):
+        # The dicts are cleared in place, since timed() functions hold on to
+        # them
+        self.time.update(dict.fromkeys(self.stages, 0.0))
+        self.calls.update(dict.fromkeys(self.stages, 0))
+        self.blocks.update({CLEAN: 0, CORRECTED: 0, FAILED: 0})
+        self.errors.clear()
+        self.positions.clear()
+
+    def snapshot(self):
+        """Returns a copy of the counters as a dict of dicts"""
+        return {
+                'time': dict(self.time),
+                'calls': dict(self.calls),
+                'blocks': dict(self.blocks),
+                'errors': dict(self.errors),
+                'positions': dict(self.positions),
+                }
+
+    def timed(self, stage, method):
+        """Returns a function that calls method and adds the time it takes
+        to stage"""
+        clock = time.time
+        times = self.time
+        calls = self.calls
+        def timed(*args):
+            start = clock()
+            try:
+                return method(*args)
+            finally:
+                times[stage] += clock() - start
+                calls[stage] += 1
+        return timed
+
+    def add_block(self, errors):
+        """Counts a decoded block, given the number of symbols corrected
+        or None if it failed"""
+        if errors is None:
+            self.blocks[FAILED] += 1
+        elif errors:
+            self.blocks[CORRECTED] += 1
+            self.errors[errors] = self.errors.get(errors, 0) + 1
+        else:
+            self.blocks[CLEAN] += 1
+
+    def add_positions(self, positions):
+        for i in positions:
+            self.positions[i] = self.positions.get(i, 0) + 1
+
+# Plans build the lookup tables that have an entry per symbol value for each
+# position, such as ptable and syndrometable, as long as they have no more
+# than this many entries. That covers every code over PF(59). Longer codes
+# over bigger fields work with the field arithmetic instead.
+LOOKUP_LIMIT = 1 << 18
+
+# Plans without lookups compute parity and syndromes with NTTs, see the ntt
+# module, when the field has them and n*(n-k), the work of the direct
+# methods, is at least NTT_WORK, or NTT_WORK_PYTHON without NumPy. Shorter
+# codes are faster the direct way.
+NTT_WORK = 1 << 12
+NTT_WORK_PYTHON = 1 << 17
+
+# The key equation solvers RSCoder can decode with, see its solver argument
+BERLEKAMP_MASSEY = "berlekamp_massey"
+EUCLID = "euclid"
+SOLVERS = (BERLEKAMP_MASSEY, EUCLID)
+
+class CoderPlan(object):
+    """The precomputed generator polynomial and tables for an (n, k) code
+    over a prime field, PF(59) unless another is given.
+
+    Plans only depend on n, k and the field, so get() memoizes them and
+    every RSCoder with the same parameters shares one. A plan can also be
+    saved to and loaded from a cache file, so a new process can skip
+    building it. Members that are rarely needed, like h and the NumPy
+    versions of the matrices, are computed on first use.
+
+    lookups tells whether the plan has its tables. Without them, gtable,
+    pmatrix, ptable, smatrix and chienrows are None, as are syndrometable
+    and singletable, and the coder computes parity and syndromes from g and
+    the field directly, or for long enough codes with the NTTs of
+    transforms.
+    """
+    # Maps (n, k, p) to CoderPlan instances
+    cache = {}
+    # Bumped whenever the saved tables change meaning
+    version = 2
+
+    def __init__(self, n, k, tables=None, field=PF59int):
+        """Builds the plan for an (n, k) code over field, or wraps tables
+        previously returned by tables() instead of computing them"""
+        if tables is not None:
+            field = PrimeField(tables['p'])
+        self.n = n
+        self.k = k
+        self.field = field
+        self.polynomial = Polynomial.over(field)
+        self.lookups = (field.multable is not None and
+                field.p * n * (n-k) <= LOOKUP_LIMIT)
+        self._h = None
+        self._nppmatrix = None
+        self._npsmatrix = None
+        self._singletable = None
+        self._syndrometable = None
+        self._transforms = None
+
+        multable = field.multable
+        exptable = field.exptable
+        order = field.order
+
+        if tables is not None:
+            self.g = self.polynomial(tables['g'])
+            self.gtable = tables['gtable']
+            self.pmatrix = tables['pmatrix']
+            self.ptable = tables['ptable']
+            self.smatrix = tables['smatrix']
+        else:
+            self._build()
+
+        # Chien search tables: chienrows[i] is the multiplication table row
+        # for α^-i, which steps the register for the z^i term of the error
+        # locator from one position to the next
+        self.chienrows = None
+        if self.lookups:
+            self.chienrows = tuple(multable[exptable[(-i) % order]]
+                    for i in xrange(n-k+1))
+        # chienpoints[j] is α^-j, the point sigma is zero at if there is an
+        # error at position j
+        self.chienpoints = tuple(exptable[(-j) % order] for j in xrange(n))
+        # The points the syndromes evaluate a codeword at, α^1 to α^(n-k)
+        self.syndromepoints = list(exptable[1:n-k+1])
+
+    def _build(self):
+        n = self.n
+        k = self.k
+        field = self.field
+        multable = field.multable
+        exptable = field.exptable
+        order = field.order
+        p = field.p
+
+        # Generate the generator polynomial for RS codes
+        # g(x) = (x-α^1)(x-α^2)...(x-α^(n-k))
+        # α is the generator of the field, 2 for PF(59)
+        one = field(1)
+        alpha = field(field.generator)
+        g = self.polynomial((one,))
+        for i in xrange(1,n-k+1):
+            g = g * self.polynomial((one, -alpha**i))
+
+        self.g = g
+
+        if not self.lookups:
+            self.gtable = self.pmatrix = self.ptable = self.smatrix = None
+            return
+
+        # Feedback tables for the division shift register: gtable[f] holds f
+        # times each coefficient of g below the leading 1, for each of the p
+        # possible feedback values f
+        self.gtable = tuple(tuple(multable[f][c] for c in g.raw[1:])
+                for f in xrange(p))
+
+        # Parity table for the encoder. Parity is linear in the message, so
+        # ptable[i][s] holds the parity symbols of a message that is all zeros
+        # except for symbol s at position i. Starting from the last position,
+        # whose parity for s=1 is just g below the leading 1, each position's
+        # parity is the next one's shifted through the register once.
+        parity = list(g.raw[1:])
+        unit = []
+        for i in xrange(k):
+            unit.append(parity)
+            row = self.gtable[(-parity[0]) % p]
+            parity = [field.addtable[a][b] for a, b in zip(parity[1:], row)]
+            parity.append(row[-1])
+        unit.reverse()
+        # pmatrix is the k x (n-k) systematic parity matrix: row i is the
+        # parity of a 1 at message position i
+        self.pmatrix = tuple(tuple(u) for u in unit)
+        self.ptable = tuple(tuple(tuple(multable[s][c] for c in u)
+            for s in xrange(p)) for u in unit)
+
+        # smatrix is the (n-k) x n Vandermonde matrix of powers of α. Row l-1
+        # evaluates a codeword at α^l, so multiplying by it gives all of the
+        # syndromes at once.
+        self.smatrix = tuple(tuple(exptable[(l * (n-1-i)) % order]
+            for i in xrange(n)) for l in xrange(1, n-k+1))
+
+    @property
+    def h(self):
+        # h(x) = (x-α^(n-k+1))...(x-α^n)
+        if self._h is None:
+            one = self.field(1)
+            alpha = self.field(self.field.generator)
+            h = self.polynomial((one,))
+            for i in xrange(self.n-self.k+1,self.n+1):
+                h = h * self.polynomial((one, alpha**i))
+            self._h = h
+        return self._h
+
+    @property
+    def nppmatrix(self):
+        """pmatrix as a NumPy float64 array"""
+        if self._nppmatrix is None:
+            self._nppmatrix = numpy.array(self.pmatrix, dtype=numpy.float64)
+            self._nppmatrix.shape = (self.k, self.n-self.k)
+        return self._nppmatrix
+
+    @property
+    def npsmatrix(self):
+        """smatrix transposed, as a NumPy float64 array"""
+        if self._npsmatrix is None:
+            self._npsmatrix = numpy.array(self.smatrix, dtype=numpy.float64).T
+            self._npsmatrix.shape = (self.n, self.n-self.k)
+        return self._npsmatrix
+
+    @property
+    def syndrometable(self):
+        """Syndrome table for the decoder. Syndromes are linear in the
+        received symbols, so syndrometable[i][s] holds the n-k syndromes of
+        a block that is all zeros except for symbol s at index i."""
+        if self._syndrometable is None and self.lookups:
+            multable = self.field.multable
+            self._syndrometable = tuple(
+                    tuple(tuple(multable[s][c] for c in column)
+                        for s in xrange(self.field.p))
+                    for column in izip(*self.smatrix))
+        return self._syndrometable
+
+    @property
+    def singletable(self):
+        """Index of every single symbol error by its first two syndromes.
+        Entry p*S1 + S2 is the (position, magnitude) of the one error that
+        gives the syndromes S1 and S2, or None. Only exists for codes that
+        can correct an error and have lookups."""
+        if self._singletable is None and self.n - self.k >= 2 and \
+                self.lookups:
+            p = self.field.p
+            multable = self.field.multable
+            # A magnitude y error at position j has S_l = y * α^(jl), so
+            # S1 = y*X and S2 = S1*X with X = α^j
+            table = [None] * (p*p)
+            for j in xrange(self.n):
+                row = multable[self.field.exptable[j]]
+                for y in xrange(1, p):
+                    s1 = row[y]
+                    table[p*s1 + row[s1]] = (j, y)
+            self._singletable = tuple(table)
+        return self._singletable
+
+    @property
+    def transforms(self):
+        """The ntt.CodeTransforms for the parity and syndromes of this code,
+        built on first use. None for plans with lookups, for codes below the
+        NTT_WORK threshold, and for fields without NTTs long enough."""
+        threshold = NTT_WORK if numpy is not None else NTT_WORK_PYTHON
+        if self.lookups or self.n * (self.n-self.k) < threshold:
+            return None
+        if self._transforms is None and \
+                CodeTransforms.supports(self.field, self.n, self.k):
+            self._transforms = CodeTransforms(self.field, self.n, self.k,
+                    self.g)
+        return self._transforms
+
+    def tables(self):
+        """Returns the tables that make up this plan, as a dict of plain
+        tuples of ints suitable for marshal"""
+        return {
+                'version': self.version,
+                'n': self.n,
+                'k': self.k,
+                'p': self.field.p,
+                'g': tuple(self.g.raw),
+                'gtable': self.gtable,
+                'pmatrix': self.pmatrix,
+                'ptable': self.ptable,
+                'smatrix': self.smatrix,
+                }
+
+    def save(self, filename):
+        """Writes this plan to a cache file. The file is written under a
+        temporary name and renamed into place, so a concurrent load() never
+        sees a partial file."""
+        tmpname = "%s.%d.tmp" % (filename, os.getpid())
+        with open(tmpname, "wb") as f:
+            marshal.dump(self.tables(), f)
+        os.rename(tmpname, filename)
+
+    @classmethod
+    def load(cls, filename, n, k, field=PF59int):
+        """Reads the plan for an (n, k) code over field from a cache file
+        written by save(). Returns None if the file is missing, unreadable or
+        for some other code."""
+        try:
+            with open(filename, "rb") as f:
+                tables = marshal.load(f)
+            if tables['version'] != cls.version or \
+                    (tables['n'], tables['k'], tables['p']) != \
+                    (n, k, field.p):
+                return None
+            return cls(n, k, tables)
+        except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+            return None
+
+    @classmethod
+    def get(cls, n, k, cachedir=None, field=PF59int):
+        """Returns the plan for an (n, k) code over field, building it only
+        once per process.
+
+        If cachedir is given, or the RS_PLAN_CACHE environment variable is
+        set, the plan is first looked for in a cache file in that directory,
+        and saved there after being built.
+        """
+        key = (n, k, field.p)
+        try:
+            return cls.cache[key]
+        except KeyError:
+            pass
+
+        if cachedir is None:
+            cachedir = os.environ.get("RS_PLAN_CACHE")
+        plan = None
+        if cachedir:
+            filename = os.path.join(cachedir, "rs-plan-%d-%d-%d.marshal" %
+                    (n, k, field.p))
+            plan = cls.load(filename, n, k, field)
+        if plan is None:
+            plan = cls(n, k, field=field)
+            if cachedir:
+                try:
+                    plan.save(filename)
+                except (IOError, OSError):
+                    # The cache is only an optimization
+                    pass
+
+        cls.cache[key] = plan
+        return plan
 
 class RSCoder(object):
-    def __init__(self, n, k):
+    def __init__(self, n, k, cachedir=None, alphabet=None, singletable=True,
+            instrument=False, field=PF59int, solver=BERLEKAMP_MASSEY):
         """Creates a new Reed-Solomon Encoder/Decoder object configured with
         the given n and k values.
-        n is the length of a codeword, must be less than 256
+        n is the length of a codeword, must be less than the field size p
         k is the length of the message, must be less than n
 
         The code will have error correcting power s where 2s = n - k
 
-        The typical RSCoder is RSCoder(255, 223)
+        The typical RSCoder is RSCoder(58, 46)
+
+        field is the class of the symbols, PF59int or another class returned
+        by ffp.PrimeField(). A bigger field allows longer codewords, for
+        example RSCoder(255, 223, field=PrimeField(257)).
+
+        The precomputed tables are shared with other coders for the same n,
+        k and field, see CoderPlan.get() for the optional cachedir.
+
+        Strings are converted to and from symbols with alphabet, an Alphabet
+        object, BASE58 by default. Its character for symbol 0 is used for
+        padding. Alphabets have 59 characters, so coders over other fields
+        have no alphabet. They take and return symbols instead of strings:
+        messages and codewords are sequences of ints from 0 to p-1, padded
+        with zeros, and come back as arrays of the field's typecode.
+
+        If singletable is true, blocks with exactly one error are corrected
+        with a lookup in the plan's single error table instead of running the
+        whole decoder. singlelookups and singlehits count how often that
+        table is tried and how often it finds the error.
+
+        If instrument is true, the coder keeps a DecodeStats of the time
+        spent in each decoder stage and of the blocks and errors it sees,
+        see stats(). Otherwise the decoder runs without any bookkeeping.
+        Coders in decode_many() worker processes are never instrumented.
+
+        solver picks the algorithm that finds the error locator and
+        evaluator from the syndromes, one of SOLVERS: BERLEKAMP_MASSEY, the
+        default, or EUCLID for Sugiyama's extended Euclidean algorithm. Both
+        correct exactly the same blocks.
         """
         if n < 0 or k < 0:
             raise ValueError("n and k must be positive")
-        if not n < 59:
-            raise ValueError("n must be at most 255")
+        if not n < field.p:
+            raise ValueError("n must be at most %d" % (field.p - 1))
         if not k < n:
             raise ValueError("Codeword length n must be greater than message"
                     " length k")
+        if field is PF59int:
+            if alphabet is None:
+                alphabet = BASE58
+        elif alphabet is not None:
+            raise ValueError("Alphabets only work with PF(59) symbols")
+        if solver not in SOLVERS:
+            raise ValueError("solver must be one of %s" % ", ".join(SOLVERS))
         self.n = n
         self.k = k
-
-        # Generate the generator polynomial for RS codes
-        # g(x) = (x-α^1)(x-α^2)...(x-α^(n-k))
-        # α is 3, a generator for GF(2^8)
-        g = Polynomial((PF59int(1),))
-        for alpha in xrange(1,n-k+1):
-            p = Polynomial((PF59int(1), -PF59int(2)**alpha))
-            g = g * p
-
-        self.g = g
-
-        # h(x) = (x-α^(n-k+1))...(x-α^n)
-        h = Polynomial((PF59int(1),))
-        for alpha in xrange(n-k+1,n+1):
-            p = Polynomial((PF59int(1), PF59int(2)**alpha))
-            h = h * p
-        self.h = h
-
-        # g*h is used in verification, and is always x^n-1
-        # TODO: This is hardcoded for (255,223)
-        # But it doesn't matter since my verify method doesn't use it
-        self.gtimesh = Polynomial(x58=PF59int(1), x0=PF59int(1))
+        self.field = field
+        self.alphabet = alphabet
+        self.solver = solver
+
+        # The generator polynomial and all of the tables come from the plan,
+        # which is shared by every coder for the same n, k and field
+        plan = CoderPlan.get(n, k, cachedir, field)
+        self.plan = plan
+        self.polynomial = plan.polynomial
+        self.g = plan.g
+        self.gtable = plan.gtable
+        self.pmatrix = plan.pmatrix
+        self.ptable = plan.ptable
+        self.smatrix = plan.smatrix
+        self.chienrows = plan.chienrows
+        self.singletable = plan.singletable if singletable else None
+        self.singlelookups = 0
+        self.singlehits = 0
+
+        self._stats = None
+        if instrument:
+            self._instrument()
+
+    def _instrument(self):
+        """Replaces the decoder stages on this instance with versions that
+        update a DecodeStats, leaving the class untouched so coders that
+        aren't instrumented pay nothing"""
+        stats = self._stats = DecodeStats()
+        n = self.n
+        correct = stats.timed("decode", self._correct)
+        forney = stats.timed("forney", self._forney)
+        single_error = stats.timed("single_error", self._single_error)
+
+        def counted_correct(symbols, erased=(), received=()):
+            corrections = correct(symbols, erased, received)
+            if corrections is None:
+                stats.add_block(None)
+            else:
+                stats.add_block(len(corrections[0]))
+                stats.add_positions(n-1-p for p in corrections[0])
+            return corrections
+
+        self._correct = counted_correct
+        self._forney = forney
+        self._single_error = single_error
+        for stage in ("syndromes", "berlekamp_massey", "euclid",
+                "chien_search"):
+            method = getattr(self, "_" + stage)
+            setattr(self, "_" + stage, stats.timed(stage, method))
+
+    def stats(self, reset=False):
+        """Returns a snapshot of the counters of an instrumented coder, see
+        DecodeStats, or None if the coder isn't instrumented. If reset is
+        true the counters start over from zero."""
+        if self._stats is None:
+            return None
+        snapshot = self._stats.snapshot()
+        if reset:
+            self._stats.reset()
+        return snapshot
+
+    @property
+    def h(self):
+        # h(x) = (x-α^(n-k+1))...(x-α^n), only computed if asked for
+        return self.plan.h
+
+    @property
+    def singlehitrate(self):
+        """Fraction of the blocks looked up in the single error table that
+        it corrected"""
+        if not self.singlelookups:
+            return 0.0
+        return float(self.singlehits) / self.singlelookups
 
     def encode(self, message, poly=False):
         """Encode a given string with reed-solomon encoding. Returns a byte
@@ -90,60 +720,326 @@ class RSCoder(object):
         If a message is < k bytes long, it is assumed to be padded at the front
         with null bytes.
 
-        The sequence returned is always n bytes long.
+        The sequence returned is always n bytes long. For a coder without an
+        alphabet, the message is a sequence of symbols, and the codeword is
+        returned as an array of n symbols.
 
         If poly is not False, returns the encoded Polynomial object instead of
         the polynomial translated back to a string (useful for debugging)
         """
         n = self.n
         k = self.k
-        message=message.rjust(k,"0")
+        m = self._to_symbols(message, k)
 
-        if len(message)>k:
+        if len(m)>k:
             raise ValueError("Message length is max %d. Message was %d" % (k,
-                len(message)))
+                len(m)))
 
-        # Encode message as a polynomial:
-        m = Polynomial(PF59int(b58conv(x)) for x in message)
+        parity = self._parity(m)
 
-        # Shift polynomial up by n-k by multiplying by x^(n-k)
-        mprime = m * Polynomial((PF59int(1),) + (PF59int(0),)*(n-k))
+        if poly:
+            return self.polynomial(m.tolist() + parity)
+
+        if self.alphabet is None:
+            return m + array(self.field.typecode, parity)
+        # Turn the parity symbols back into a string
+        return message.rjust(k, self.alphabet.pad) + \
+                self.alphabet.to_string(parity)
+
+    def _parity(self, m):
+        """Returns the n-k parity symbols for the k message symbols m, as a
+        list of ints"""
+        # The parity symbols are the remainder of m(x)*x^(n-k) divided by g,
+        # negated so that the codeword is a multiple of g. Rather than
+        # running the division shift register over the message, add up the
+        # precomputed parity of each message symbol.
+        if self.ptable is None:
+            transforms = self.plan.transforms
+            if transforms is not None:
+                return transforms.parity(m)
+            # Without the tables, divide
+            p = self.field.p
+            shifted = array(self.field.typecode, m)
+            shifted.extend(array(self.field.typecode, [0]) * (self.n-self.k))
+            r = self.polynomial._new(shifted) % self.g
+            parity = [-c % p for c in r.raw]
+            return [0] * (self.n-self.k-len(parity)) + parity
+        rows = map(getitem, self.ptable, m)
+        if not rows:
+            return [0] * (self.n-self.k)
+        p = self.field.p
+        return [sum(column) % p for column in izip(*rows)]
+
+    def _to_symbols(self, block, length):
+        """Converts a block, a string for coders with an alphabet and a
+        sequence of ints otherwise, to an array of symbols. Blocks shorter
+        than length are padded with zeros at the front, so symbols[i] is
+        always the coefficient of x^(length-1-i). Longer ones are left as
+        they are for the caller to reject."""
+        if self.alphabet is not None:
+            symbols = self.alphabet.to_symbols(block)
+        else:
+            p = self.field.p
+            try:
+                symbols = array(self.field.typecode, block)
+            except OverflowError:
+                symbols = None
+            if symbols is None or (symbols and max(symbols) >= p):
+                raise ValueError("Symbols must be in the range 0 to %d" %
+                        (p - 1))
+        if len(symbols) < length:
+            symbols = array(symbols.typecode, [0]) * \
+                    (length - len(symbols)) + symbols
+        return symbols
+
+    def _from_symbols(self, symbols):
+        """Converts symbols back to a string, or to an array of the field's
+        typecode for coders without an alphabet"""
+        if self.alphabet is None:
+            return array(self.field.typecode, symbols)
+        return self.alphabet.to_string(symbols)
+
+    def _strip(self, message, nostrip=False):
+        """Strips the padding from the front of a message, unless nostrip
+        is true"""
+        if nostrip:
+            return message
+        if self.alphabet is not None:
+            return message.lstrip(self.alphabet.pad)
+        start = 0
+        while start < len(message) and not message[start]:
+            start += 1
+        return message[start:]
+
+    def encode_into(self, src, dst, offset=0, symbols=False):
+        """Encodes the k message bytes in src into n codeword bytes written
+        to dst at offset, and returns the offset just past them.
+
+        src can be any buffer (str, bytearray, memoryview, a NumPy uint8
+        array...) and dst any writable buffer such as a bytearray or a
+        memoryview of one. Unlike encode(), the message isn't padded, so src
+        must hold exactly k bytes. If symbols is true, src holds symbols
+        from 0 to p-1 rather than alphabet characters, and so does dst.
+        Coders without an alphabet only work on symbols, and only if they fit
+        in a byte.
+        """
+        n = self.n
+        k = self.k
+        self._check_into(symbols)
+        if len(src) != k:
+            raise ValueError("Message length must be %d. Message was %d" %
+                    (k, len(src)))
+        if symbols:
+            m = bytearray(src)
+            if max(m) >= self.field.p:
+                raise ValueError("Symbols must be in the range 0 to %d" %
+                        (self.field.p - 1))
+            code = m + bytearray(self._parity(m))
+        else:
+            m = self.alphabet.bytes_to_symbols(src)
+            code = bytearray(src) + self.alphabet.symbols_to_bytes(
+                    self._parity(m))
+        memoryview(dst)[offset:offset+n] = code
+        return offset + n
+
+    def _check_into(self, symbols):
+        """Raises ValueError if encode_into() and decode_into() can't work
+        on this coder's blocks as bytes"""
+        if self.alphabet is None and not symbols:
+            raise ValueError("A coder without an alphabet needs symbols=True")
+        if self.field.p > 256:
+            raise ValueError("Symbols of PF(%d) don't fit in bytes" %
+                    self.field.p)
+
+    def _batch(self, blocks, length):
+        """Converts a batch of blocks for the batch methods. blocks is either
+        a list of strings, each left padded with the alphabet's padding
+        character to length symbols, or a
+        2-D array (or list of lists) of symbols with length integers in the
+        range 0 to p-1 per row.
+
+        Returns a flag telling whether blocks were strings, and the symbols
+        as an (N, length) array of unsigned ints just wide enough for the
+        field, uint8 for PF(59), or a list of lists of ints if NumPy isn't
+        available.
+
+        Raises AlphabetError with a (block index, index in the block) pair
+        for every invalid character in the batch.
+        """
+        strings = isinstance(blocks, (list, tuple)) and len(blocks) > 0 and \
+                isinstance(blocks[0], basestring)
+        if strings and self.alphabet is None:
+            raise ValueError("A coder without an alphabet takes symbols, "
+                    "not strings")
+        p = self.field.p
+        if strings:
+            try:
+                return self._batch_strings(blocks, length)
+            except AlphabetError:
+                invalid = self.alphabet.invalid
+                raise AlphabetError([(b, i) for b, block in enumerate(blocks)
+                    for i in invalid(block)])
+
+        if numpy is None:
+            rows = []
+            for block in blocks:
+                block = list(block)
+                if len(block) != length or not all(0 <= x < p for x in block):
+                    raise ValueError("Each block must be %d symbols in the "
+                            "range 0 to %d" % (length, p - 1))
+                rows.append(block)
+            return strings, rows
+
+        a = numpy.asarray(blocks)
+        if a.size == 0:
+            a = a.reshape(-1, length)
+        if a.ndim != 2 or a.shape[1] != length:
+            raise ValueError("Expected an (N, %d) array of symbols, got shape "
+                    "%r" % (length, a.shape))
+        if a.size and (a.min() < 0 or a.max() >= p):
+            raise ValueError("Symbols must be in the range 0 to %d" % (p - 1))
+        return strings, a.astype(self.field.typecode)
+
+    def _batch_strings(self, blocks, length):
+        """Does the work of _batch() for a list of strings"""
+        pad = self.alphabet.pad
+        if numpy is None:
+            rows = []
+            for block in blocks:
+                if len(block) > length:
+                    raise ValueError("Block length is max %d. Block was %d"
+                            % (length, len(block)))
+                rows.append(self.alphabet.to_symbols(
+                    block.rjust(length, pad)).tolist())
+            return True, rows
+
+        padded = "".join(block.rjust(length, pad) for block in blocks)
+        if len(padded) != length * len(blocks):
+            raise ValueError("Block length is max %d" % length)
+        a = self.alphabet.to_symbols(padded)
+        return True, numpy.frombuffer(a, dtype=numpy.uint8).reshape(
+                len(blocks), length)
+
+    def encode_many(self, messages, jobs=None, batchsize=4096):
+        """Encodes a batch of messages at once.
+
+        messages is either a list of strings, each padded and encoded just
+        like encode() does, or a 2-D array (or list of lists) of symbols with
+        one row of k integers in the range 0 to p-1 per message. Returns a
+        list of codeword strings for strings, and for symbols an (N, n) array
+        of codeword symbols, uint8 for PF(59), or a list of lists if NumPy
+        isn't available.
+
+        With NumPy, all of the parity symbols are computed at once as a
+        single matrix product modulo p against pmatrix. Without it, or for
+        a plan without lookups, each message goes through the same tables or
+        division as encode().
+
+        With jobs greater than 1, messages may be any iterable. It is
+        encoded in batches on a pool of worker processes by encode_batches(),
+        and the results are put back together in order, so all of them are
+        held in memory at once.
+        """
+        n = self.n
+        k = self.k
+        if jobs is not None and jobs > 1:
+            results = list(self.encode_batches(messages, jobs, batchsize))
+            if numpy is not None and results and \
+                    isinstance(results[0], numpy.ndarray):
+                return numpy.vstack(results)
+            return list(chain.from_iterable(results))
+
+        strings, m = self._batch(messages, k)
+
+        if numpy is None:
+            codes = [row + self._parity(row) for row in m]
+            if strings:
+                return map(self.alphabet.to_string, codes)
+            return codes
+        if self.pmatrix is None:
+            return numpy.array([row + self._parity(row) for row in m.tolist()],
+                    dtype=m.dtype).reshape(-1, n)
+
+        # Products are below 2**53 so the floating point dot is exact, and
+        # unlike integer dot it goes through BLAS
+        parity = numpy.dot(m, self.plan.nppmatrix) % self.field.p
+        codes = numpy.hstack((m, parity.astype(m.dtype)))
+
+        if strings:
+            s = codes.tostring().translate(self.alphabet.chartable)
+            return [s[i:i+n] for i in xrange(0, len(s), n)]
+        return codes
+
+    def encode_batches(self, messages, jobs=None, batchsize=4096):
+        """Encodes an iterable of messages in batches of batchsize, yielding
+        what encode_many() returns for each batch, in order.
+
+        With jobs greater than 1, batches are encoded on a pool of that many
+        worker processes, see decode_many(). Only a few batches are held in
+        memory at a time, however long messages is.
+        """
+        return self._map_batches("encode_many", _batches(messages, batchsize),
+                jobs)
 
-        # mprime = q*g + b for some q
-        # so let's find b:
-        b = mprime % self.g
+    def syndromes_many(self, codes):
+        """Computes the syndromes of a batch of received codewords.
 
-        # Subtract out b, so now c = q*g
-        c = mprime - b
-        # Since c is a multiple of g, it has (at least) n-k roots: α^1 through
-        # α^(n-k)
-       
-        if poly:
-            return c
+        codes is either a list of strings, left padded to n symbols like
+        verify() treats them, or a 2-D array (or list of lists) of
+        symbols with one row of n integers in the range 0 to p-1 per
+        codeword. Returns an (N, n-k) array like encode_many(), or a list of
+        lists of ints without NumPy, where row i holds the codeword evaluated
+        at α^1 through α^(n-k), α being 2 for PF(59).
 
-        # Turn the polynomial c back into a byte string
-        return "".join(r58conv(x) for x in c.coefficients).rjust(n, "0")
+        With NumPy this is a single matrix product modulo p against the
+        transposed Vandermonde matrix smatrix.
+        """
+        strings, r = self._batch(codes, self.n)
+        p = self.field.p
+
+        if self.smatrix is None:
+            if numpy is None:
+                return [self._syndromes(row)[1:] for row in r]
+            return numpy.array([self._syndromes(row)[1:] for row in r.tolist()],
+                    dtype=r.dtype).reshape(-1, self.n-self.k)
+        if numpy is None:
+            smatrix = self.smatrix
+            return [[sum(map(mul, row, s)) % p for s in smatrix] for row in r]
+
+        return (numpy.dot(r, self.plan.npsmatrix) % p).astype(r.dtype)
+
+    def verify_many(self, codes):
+        """Verifies a batch of codewords, taking the same codes as
+        syndromes_many(). Returns a boolean mask, as an array or a list
+        without NumPy, that is True for each valid codeword: those whose
+        syndromes are all zero. Only the others need to be passed to
+        decode().
+        """
+        s = self.syndromes_many(codes)
+        if numpy is None:
+            return [not any(row) for row in s]
+        return ~s.any(axis=1)
 
     def verify(self, code):
         """Verifies the code is valid by testing that the code as a polynomial
         code divides g
         returns True/False
         """
-        n = self.n
-        k = self.k
-        h = self.h
         g = self.g
 
-        c = Polynomial(PF59int(b58conv(x)) for x in code)
+        symbols = self._to_symbols(code, self.n)
+        transforms = self.plan.transforms
+        if transforms is not None and len(symbols) == self.n:
+            # For long codes, the syndromes are much faster than the division
+            return not any(transforms.syndromes(symbols))
 
-        # This works too, but takes longer. Both checks are just as valid.
-        #return (c*h)%gtimesh == Polynomial(x0=0)
+        c = self.polynomial._new(symbols)
 
         # Since all codewords are multiples of g, checking that code divides g
         # suffices for validating a codeword.
-        return c % g == Polynomial(x0=0)
+        return c % g == self.polynomial(x0=0)
 
-    def decode(self, r, nostrip=False):
+    def decode(self, r, nostrip=False, erasures=None):
         """Given a received string or byte array r, attempts to decode it. If
         it's a valid codeword, or if there are no more than (n-k)/2 errors, the
         message is returned.
@@ -153,93 +1049,426 @@ class RSCoder(object):
         stripped, but that can cause problems if decoding binary data. When
         nostrip is True, messages returned are always k bytes long. This is
         useful to make sure no data is lost when decoding binary data.
+
+        erasures is an optional list of indexes into r of characters that
+        are known to be bad, for example the ones alphabet.invalid() reports.
+        Their contents are ignored, so they may hold any character. Each
+        erasure only uses up one parity symbol instead of two, so e errors
+        and f erasures are corrected as long as 2e + f <= n-k.
         """
+        return self.decode_result(r, nostrip, erasures).message
 
+    def _decode(self, r, nostrip=False, erasures=None):
+        """Returns the message along with the number of errors and erasures
+        corrected, which is None if there were too many to correct. The
+        message is then returned as received.
+        """
+        result = self.decode_result(r, nostrip, erasures)
+        return result.message, result.errors
+
+    def decode_result(self, r, nostrip=False, erasures=None):
+        """Decodes r like decode(), but returns a DecodeResult with the
+        status of the block and the positions and magnitudes of the
+        corrections along with the message.
+
+        r is converted to symbols once, and a block whose syndromes are all
+        zero is clean, so that is all the work a clean block takes.
+        Corrections are made in place in the symbol array, and strings are
+        only built from it if the result is asked for them.
+        """
         n = self.n
         k = self.k
-        
-        tek = Polynomial(PF59int(b58conv(x)) for x in r)
-        
-        if self.verify(r):
-            # The last n-k bytes are parity
-            if nostrip:
-                return r[:-(n-k)]
-            else:
-                return r[:-(n-k)].lstrip("0")
-        
-        # Turn r into a polynomial
-        r = Polynomial(PF59int(b58conv(x)) for x in r)
-
-        # Compute the syndromes:
-        sz = self._syndromes(r)
-
-        # Find the error locator polynomial and error evaluator polynomial
-        # using the Berlekamp-Massey algorithm
-        sigma, omega = self._berlekamp_massey(sz)
-
-        # Now use Chien's procedure to find the error locations
-        # j is an array of integers representing the positions of the errors, 0
-        # being the rightmost byte
-        # X is a corresponding array of GF(2^8) values where X_i = alpha^(j_i)
-        X, j = self._chien_search(sigma)
-
-        # And finally, find the error magnitudes with Forney's Formula
-        # Y is an array of GF(2^8) values corresponding to the error magnitude
-        # at the position given by the j array
-        Y = self._forney(omega, X)
-
-        # Put the error and locations together to form the error polynomial
-        Elist = []
-        for i in xrange(58):
-            if i in j:
-                Elist.append(PF59int(Y[j.index(i)]))
-            else:
-                Elist.append(PF59int(0))
-        E = Polynomial(reversed(Elist))
-
-        # And we get our real codeword!
-        c = r - E
 
-        # Form it back into a string and return all but the last n-k bytes
-        ret = "".join(r58conv(x) for x in c.coefficients[:-(n-k)])
-        #                                            :-(
+        erased = self._erased(erasures, len(r))
+        received = r
+        if erased:
+            # Erased characters may not even be in the alphabet
+            if self.alphabet is None:
+                r = list(r)
+                fill = 0
+            elif isinstance(r, unicode):
+                r = list(r)
+                fill = self.alphabet.pad
+            else:
+                r = bytearray(r)
+                fill = self.alphabet.pad
+            for e in erased:
+                r[len(r) - 1 - e] = fill
+            if isinstance(r, bytearray):
+                r = str(r)
+            elif self.alphabet is not None:
+                r = "".join(r)
+
+        # Convert the string only once. Shorter blocks are padded at the
+        # front, so symbols[i] is always the coefficient of x^(n-1-i).
+        symbols = self._to_symbols(r, n)
+        if len(symbols) > n:
+            raise ValueError("Received codeword length is max %d. "
+                    "Codeword was %d" % (n, len(symbols)))
+
+        if len(erased) > n-k:
+            # More unknowns than parity symbols, even with no errors
+            if self._stats is not None:
+                self._stats.add_block(None)
+            return DecodeResult(self, received, symbols, None, nostrip)
+
+        return DecodeResult(self, received, symbols, self._correct(symbols,
+            erased, self._received(received, erased)), nostrip)
+
+    def _erased(self, erasures, length):
+        """Erasures are given as indexes into a received block of the given
+        length, but the decoder works with powers of x, 0 being the
+        rightmost symbol. Returns the sorted powers."""
+        if not erasures:
+            return ()
+        erased = sorted(set(length - 1 - i for i in erasures))
+        if erased[0] < 0 or erased[-1] >= self.n:
+            raise ValueError("Erasures must be indexes into the codeword")
+        return erased
+
+    def _received(self, block, erased, symbols=False):
+        """Returns the symbols that the block, a string or a sequence of
+        ints, had at the erased positions, with None for characters outside
+        the alphabet or symbols outside the field. A block of ints holds
+        characters for coders with an alphabet, unless symbols is true."""
+        length = len(block)
+        values = [block[length-1-e] for e in erased]
+        if self.alphabet is None or symbols:
+            p = self.field.p
+            return [x if 0 <= x < p else None for x in values]
+        lookup = self.alphabet.lookup
+        return [lookup.get(chr(c) if isinstance(c, int) else c)
+                for c in values]
+
+    def _correct(self, symbols, erased=(), received=()):
+        """Corrects the n received symbols, an array or bytearray, in place,
+        given the sorted positions of any erasures, which have been set to 0,
+        and received, the symbols that were at those positions as returned
+        by _received(). Returns a list of the positions corrected, as powers
+        of x, and a list of the error magnitudes, or None, leaving symbols
+        untouched, if there were too many errors to correct.
+        """
+        n = self.n
+        k = self.k
 
-        if nostrip:
-            # Polynomial objects don't store leading 0 coefficients, so we
-            # actually need to pad this to k bytes
-            return ret.rjust(k, "0")
+        # Compute the syndromes. A valid codeword is a multiple of g, so it
+        # is zero at every root of g, and its syndromes are all zero.
+        sz = self._syndromes(symbols)
+        if not any(sz):
+            if erased:
+                return self._erasure_corrections(symbols, [], [], erased,
+                        received)
+            return [], []
+
+        # Most damaged blocks have a single bad symbol, which the syndromes
+        # identify directly
+        single = None
+        if self.singletable is not None and not erased:
+            single = self._single_error(sz)
+
+        if single is not None:
+            j = [single[0]]
+            Y = [single[1]]
+        elif len(erased) > n-k:
+            return None
         else:
-            return ret
-
-
-    def _syndromes(self, r):
-        """Given the received codeword r in the form of a Polynomial object,
-        computes the syndromes and returns the syndrome polynomial
+            # Find the error locator polynomial and error evaluator
+            # polynomial using the Berlekamp-Massey algorithm, or the
+            # Euclidean algorithm if the coder was created with that solver
+            # Known erasures are folded in up front, in which case sigma
+            # locates both the errors and the erasures
+            if self.solver == EUCLID:
+                sigma, omega = self._euclid(sz, erased)
+            else:
+                sigma, omega = self._berlekamp_massey(sz, erased)
+            if sigma is None:
+                return None
+
+            # Now use Chien's procedure to find the error locations
+            # j is an array of integers representing the positions of the
+            # errors, 0 being the rightmost byte
+            # X is a corresponding array of GF(2^8) values where X_i =
+            # alpha^(j_i)
+            X, j, D = self._chien_search(sigma)
+            if (len(j) != sigma.degree() or
+                    2*len(j) - len(erased) > n-k):
+                # Too many errors to correct
+                return None
+
+            # And finally, find the error magnitudes with Forney's Formula
+            # Y is an array of GF(2^8) values corresponding to the error
+            # magnitude at the position given by the j array
+            Y = self._forney(omega, j, D)
+
+        # Subtract the errors straight from the received symbols, and we get
+        # our real codeword! Position j is at index n-1-j.
+        p = self.field.p
+        for jl, Yl in izip(j, Y):
+            symbols[n-1-jl] = (symbols[n-1-jl] - Yl) % p
+        if erased:
+            return self._erasure_corrections(symbols, j, Y, erased, received)
+        return j, Y
+
+    def _erasure_corrections(self, symbols, j, Y, erased, received):
+        """Returns the positions and magnitudes of the corrections j and Y
+        made to the corrected symbols, measured against what was received
+        rather than against the 0 the erasures were set to. An erasure only
+        counts as corrected if the received symbol was different, or not a
+        symbol at all, in which case its magnitude is None."""
+        n = self.n
+        p = self.field.p
+        elements = self.field.elements
+        corrections = dict(izip(j, Y))
+        for e, x in izip(erased, received):
+            c = symbols[n-1-e]
+            if x is None:
+                corrections[e] = None
+            elif x != c:
+                corrections[e] = elements[(x - c) % p]
+            else:
+                corrections.pop(e, None)
+        j = sorted(corrections)
+        return j, [corrections[jl] for jl in j]
+
+    def decode_into(self, src, dst, offset=0, symbols=False, erasures=None):
+        """Decodes the n received bytes in src, writing the k message bytes
+        to dst at offset. Returns the number of errors and erasures
+        corrected, or None if there were too many to correct, in which case
+        the message is written as received.
+
+        src and dst are buffers as for encode_into(), and symbols works the
+        same way. The message is never stripped of its padding. erasures is
+        as for decode().
         """
         n = self.n
         k = self.k
-        # s[l] is the received codeword evaluated at α^l for 1 <= l <= s
-        # α in this implementation is 3
-        s = [PF59int(0)] # s[0] is 0 (coefficient of z^0)
-        t=PF59int(1)
-        for l in xrange(1, n-k+1):
-            t*=PF59int(2)
-            s.append( r.evaluate( t ) )
-
-        # Now build a polynomial out of all our s[l] values
-        # s(z) = sum(s_i * z^i, i=1..inf)
-        sz = Polynomial( reversed( s ) )
-
-        return sz
-
-    def _berlekamp_massey(self, s):
-	#THERE IS A PROBLEM HERE OR IN THE SYNDROMES THE LOCATION IS INCORRECT. AND
-	#SO IS THE WEIGHT. THE Y generation seems to be functional though it is hard to tell
+        self._check_into(symbols)
+        if len(src) != n:
+            raise ValueError("Received codeword length must be %d. "
+                    "Codeword was %d" % (n, len(src)))
+        erased = self._erased(erasures, n)
+
+        received = bytearray(src)
+        original = self._received(received, erased, symbols)
+        if symbols:
+            for e in erased:
+                received[n-1-e] = 0
+            if max(received) >= self.field.p:
+                raise ValueError("Symbols must be in the range 0 to %d" %
+                        (self.field.p - 1))
+        else:
+            # Erased characters may not even be in the alphabet
+            for e in erased:
+                received[n-1-e] = self.alphabet.pad
+            received = self.alphabet.bytes_to_symbols(received)
+
+        corrections = self._correct(received, erased, original)
+        if corrections is None:
+            message = memoryview(src)[:k]
+        elif symbols:
+            message = received[:k]
+        else:
+            message = self.alphabet.symbols_to_bytes(received[:k])
+        memoryview(dst)[offset:offset+k] = message
+        if corrections is None:
+            return None
+        return len(corrections[0])
+
+    def _as_received(self, received, nostrip):
+        """Returns the message part of a codeword that couldn't be
+        corrected, as it was received"""
+        if self.alphabet is None:
+            typecode = self.field.typecode
+            received = array(typecode, [0]) * (self.n - len(received)) + \
+                    array(typecode, received)
+        else:
+            received = received.rjust(self.n, self.alphabet.pad)
+        return self._strip(received[:self.k], nostrip)
+
+    def decode_many(self, blocks, jobs=None, batchsize=1024, nostrip=False):
+        """Decodes an iterable of received strings, yielding a tuple
+        (status, message, errors) for each block, in order.
+
+        status is CLEAN if the block was a valid codeword, CORRECTED if errors
+        were corrected, and FAILED if there were too many errors to correct.
+        message is what decode() would return, and errors the number of
+        symbols corrected, None for FAILED. Characters outside the alphabet
+        are decoded as erasures, and only make their own block fail if there
+        are too many of them.
+
+        Blocks are decoded in batches of batchsize. All of the full length
+        blocks in a batch are checked at once with verify_many(), so only
+        the dirty ones go through the full decoder. With jobs greater than
+        1, batches are decoded on a pool of that many worker processes.
+        Each worker gets this coder's tables once, when it starts, and at
+        most two batches per worker are in flight at a time.
+        """
+        for results in self._map_batches("_decode_batch",
+                _batches(blocks, batchsize), jobs, (nostrip,)):
+            for result in results:
+                yield result
+
+    def _decode_batch(self, blocks, nostrip=False):
+        """Decodes a list of received strings, returning a list of (status,
+        message, errors) as yielded by decode_many().
+
+        Characters outside the alphabet, a mistyped I or a line break for
+        example, are decoded as erasures, so a block with more of them than
+        parity symbols fails without affecting the others.
+        """
+        n = self.n
+        k = self.k
+        results = [None] * len(blocks)
+        # Maps block indexes to the indexes of their invalid characters
+        invalid = {}
+
+        full = [i for i, block in enumerate(blocks) if len(block) == n]
+        if full:
+            try:
+                clean = self.verify_many([blocks[i] for i in full])
+            except AlphabetError as e:
+                for b, i in e.positions:
+                    invalid.setdefault(full[b], []).append(i)
+                full = [i for i in full if i not in invalid]
+                clean = self.verify_many([blocks[i] for i in full]) \
+                        if full else []
+            for i, valid in izip(full, clean):
+                if valid:
+                    message = blocks[i][:k]
+                    if self.alphabet is None:
+                        message = self._from_symbols(message)
+                    results[i] = (CLEAN, self._strip(message, nostrip), 0)
+            if self._stats is not None:
+                self._stats.blocks[CLEAN] += int(sum(clean))
+
+        for i, block in enumerate(blocks):
+            if results[i] is None:
+                try:
+                    result = self.decode_result(block, nostrip,
+                            invalid.get(i))
+                except AlphabetError as e:
+                    # A short block, which verify_many() didn't see
+                    result = self.decode_result(block, nostrip, e.positions)
+                results[i] = (result.status, result.message, result.errors)
+        return results
+
+    def _map_batches(self, method, batches, jobs=None, extra=()):
+        """Calls the method with the given name on each batch, with extra as
+        further arguments, and yields the results in order.
+
+        With jobs greater than 1 the calls run on a pool of worker processes,
+        each set up once with this coder's plan tables and alphabet, rather
+        than with the coder being pickled for every call. At most two
+        batches per worker are in flight at a time, so memory use stays
+        bounded however long batches is.
+        """
+        if jobs is None or jobs <= 1:
+            method = getattr(self, method)
+            for batch in batches:
+                yield method(batch, *extra)
+            return
+
+        import multiprocessing
+        chars = self.alphabet.chars if self.alphabet is not None else None
+        pool = multiprocessing.Pool(jobs, _init_worker,
+                (self.plan.tables(), chars, self.solver))
+        try:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.apply_async(_run_worker,
+                    (method, batch) + extra))
+                if len(pending) >= 2 * jobs:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            # Also reached when the caller stops iterating early
+            pool.close()
+        pool.join()
+
+    def _encode_chunk(self, data, depth=1):
+        """Encodes a chunk of data in blocks of k symbols for the command
+        line tool, interleaving the codewords at the given depth. Returns the
+        encoded data and counts of corrected and failed blocks, which are
+        always 0."""
+        k = self.k
+        codes = "".join(self.encode_many([data[i:i+k]
+            for i in xrange(0, len(data), k)]))
+        if depth > 1:
+            codes = interleave(codes, self.n, depth)
+        return codes, 0, 0
+
+    def _decode_chunk(self, data, nostrip=False, depth=1):
+        """Decodes a chunk of data in blocks of n symbols for the command
+        line tool, deinterleaving it first if depth is over 1. Returns the
+        decoded data and counts of corrected and failed blocks.
+
+        Damaged input never stops the tool. Characters outside the alphabet
+        are decoded as erasures by _decode_batch(), and a truncated last
+        block isn't part of any interleaving group, and is decoded as it is.
+        """
+        n = self.n
+        if depth > 1:
+            cut = len(data) - len(data) % n
+            data = deinterleave(data[:cut], n, depth) + data[cut:]
+        results = self._decode_batch([data[i:i+n]
+            for i in xrange(0, len(data), n)], nostrip)
+        corrected = sum(1 for result in results if result[0] == CORRECTED)
+        failed = sum(1 for result in results if result[0] == FAILED)
+        return "".join(result[1] for result in results), corrected, failed
+
+    def _syndromes(self, symbols):
+        """Given the n received symbols, computes the syndromes and returns
+        them as a list S, S[l] being the received codeword evaluated at α^l
+        for 1 <= l <= n-k, and S[0] = 0. In other words the coefficients of
+        the syndrome polynomial s(z), lowest power first.
+
+        Each symbol looks up its contribution to all of the syndromes in the
+        plan's syndrometable, and the contributions are summed by column.
+        Without lookups, the syndromes of long codes come from the plan's
+        NTT transforms, and otherwise the received polynomial is evaluated
+        at the points with Polynomial.evaluate_many().
+        """
+        table = self.plan.syndrometable
+        if table is None:
+            transforms = self.plan.transforms
+            if transforms is not None:
+                return [0] + transforms.syndromes(symbols)
+            r = self.polynomial._new(array(self.field.typecode, symbols))
+            return [0] + r._evaluate(self.plan.syndromepoints)
+        rows = map(getitem, table, symbols)
+        p = self.field.p
+        return [0] + [sum(column) % p for column in izip(*rows)]
+
+    def _single_error(self, syndromes):
+        """Looks the syndromes, as returned by _syndromes(), up in the single
+        error table. Returns the (position, magnitude) of the error if they
+        come from exactly one error, otherwise None.
+        """
+        self.singlelookups += 1
+        single = self.singletable[self.field.p*syndromes[1] + syndromes[2]]
+        if single is None:
+            return None
+
+        # The table only saw S1 and S2. For a single error the rest of the
+        # syndromes must keep going up by the same factor X = α^j.
+        row = self.field.multable[self.field.exptable[single[0]]]
+        for l in xrange(3, self.n - self.k + 1):
+            if syndromes[l] != row[syndromes[l-1]]:
+                return None
+
+        self.singlehits += 1
+        return single
+
+    def _berlekamp_massey(self, S, erasures=()):
         """Computes and returns the error locator polynomial (sigma) and the
         error evaluator polynomial (omega)
-        The parameter s is the syndrome polynomial (syndromes encoded in a
-        generator function) as returned by _syndromes. Don't be confused with
-        the other s = (n-k)/2
+        The parameter S is the list of syndromes as returned by _syndromes,
+        the coefficients of the syndrome polynomial s(z). Don't be confused
+        with the other s = (n-k)/2
 
         Notes:
         The error polynomial:
@@ -259,141 +1488,412 @@ class RSCoder(object):
         roots are the reciprocals of the error locations
         ( 1/X_1, 1/X_2, ...)
 
-        Error evaluator polynomial omega(z) not written here
+        Error evaluator polynomial:
+        omega(z) = (1 + s(z)) * sigma(z) mod z^(n-k+1)
+        which has degree at most the number of errors, and gives the error
+        magnitudes through Forney's formula.
+
+        This is Massey's formulation: it keeps only the current locator and
+        the one from before the last length change, in fixed size lists of
+        plain ints. Each step computes the discrepancy Delta as a dot product
+        of sigma with the syndromes, and scales the correction using a table
+        inverse. If there were more errors than can be corrected, sigma comes
+        out with a degree over (n-k)/2, or without that many distinct roots,
+        or with a lower degree than the length L of the shortest linear
+        feedback shift register generating the syndromes. sigma then only
+        fits the first syndromes, and the magnitudes from Forney's formula
+        wouldn't reproduce the others, so this returns (None, None).
+
+        erasures is a list of positions known to be in error. Their locator
+        Gamma(z) = Product( 1 - α^j * z ) is the starting point for sigma,
+        and the first len(erasures) steps are skipped since Gamma already
+        accounts for them. sigma then comes out as Gamma times the locator of
+        the other errors, with a degree of up to (n-k+len(erasures))/2.
         """
         n = self.n
         k = self.k
-        
-        # Initialize:
-        sigma =  [ Polynomial((PF59int(1),)) ]
-        omega =  [ Polynomial((PF59int(1),)) ]
-        tao =    [ Polynomial((PF59int(1),)) ]
-        gamma =  [ Polynomial((PF59int(0),)) ]
-        D =      [ 0 ]
-        B =      [ 0 ]
-
-        # Polynomial constants:
-        ONE = Polynomial(z0=PF59int(1))
-        ZERO = Polynomial(z0=PF59int(0))
-        Z = Polynomial(z1=PF59int(1))
-        
-        # Iteratively compute the polynomials 2s times. The last ones will be
-        # correct
-        for l in xrange(0, n-k):
-            # Goal for each iteration: Compute sigma[l+1] and omega[l+1] such that
-            # (1 + s)*sigma[l] == omega[l] in mod z^(l+1)
-#            print(str(B[l]))
-            # For this particular loop iteration, we have sigma[l] and omega[l],
-            # and are computing sigma[l+1] and omega[l+1]
-            
-            # First find Delta, the non-zero coefficient of z^(l+1) in
-            # (1 + s) * sigma[l]
-            # This delta is valid for l (this iteration) only
-            Delta = ( (ONE + s) * sigma[l] ).get_coefficient(l+1)
-            # Make it a polynomial of degree 0
-            Delta = Polynomial(x0=Delta)
-
-            # Can now compute sigma[l+1] and omega[l+1] from
-            # sigma[l], omega[l], tao[l], gamma[l], and Delta
-            sigma.append( sigma[l] - Delta * Z * tao[l] )
-            omega.append( omega[l] - Delta * Z * gamma[l] )
-
-            # Now compute the next tao and gamma
-            # There are two ways to do this
-            if Delta == ZERO or 2*D[l] > (l+1):
-                # Rule A
-                D.append( D[l] )
-                B.append( B[l] )
-                tao.append( Z * tao[l] )
-                gamma.append( Z * gamma[l] )
-
-            elif Delta != ZERO and 2*D[l] < (l+1):
-                # Rule B
-                D.append( l + 1 - D[l] )
-                B.append( 1 - B[l] )
-                tao.append( sigma[l] // Delta )
-                gamma.append( omega[l] // Delta )
-            elif 2*D[l] == (l+1):
-                if B[l] == 0:
-                    # Rule A (same as above)
-                    D.append( D[l] )
-                    B.append( B[l] )
-                    tao.append( Z * tao[l] )
-                    gamma.append( Z * gamma[l] )
-
-                else:
-                    # Rule B (same as above)
-                    D.append( l + 1 - D[l] )
-                    B.append( 1 - B[l] )
-                    tao.append( sigma[l] // Delta )
-                    gamma.append( omega[l] // Delta )
+        p = self.field.p
+        exptable = self.field.exptable
+        invtable = self.field.invtable
+
+        # S[l] is the coefficient of z^l in s, that is the syndrome S_l. A
+        # copy, since S[0] is set to 1 for omega below.
+        S = list(S)
+
+        # Fixed size buffers, lowest power first. sigma is the current error
+        # locator and prev the locator from before the last length change.
+        sigma = [1] + [0] * (n-k)
+        f = len(erasures)
+        for e in erasures:
+            # sigma *= 1 - α^e * z
+            x = exptable[e]
+            for i in xrange(f, 0, -1):
+                sigma[i] = (sigma[i] - x * sigma[i-1]) % p
+        prev = list(sigma)
+        spare = [0] * (n-k+1)
+        # L is the number of errors sigma currently accounts for, b the
+        # discrepancy at the last length change and m the number of steps
+        # since then
+        L = f
+        b = 1
+        m = 1
+
+        for l in xrange(f, n-k):
+            # Delta is the coefficient of z^(l+1) in (1 + s) * sigma, that is
+            # how far sigma is from generating the next syndrome S_(l+1)
+            Delta = sum(imap(mul, sigma, S[l+1:l-L:-1])) % p
+            if not Delta:
+                m += 1
+                continue
+
+            if 2*L <= l + f:
+                # The length changes, so sigma will become the new prev
+                spare[:] = sigma
+
+            # sigma -= (Delta / b) * z^m * prev
+            scale = Delta * invtable[b] % p
+            for i in xrange(n-k+1-m):
+                if prev[i]:
+                    sigma[i+m] = (sigma[i+m] - scale * prev[i]) % p
+
+            if 2*L <= l + f:
+                L = l + 1 - L + f
+                prev, spare = spare, prev
+                b = Delta
+                m = 1
             else:
-                raise Exception("Code shouldn't have gotten here")
-
-
-        return sigma[-1], omega[-1]
+                m += 1
+
+        if not sigma[L]:
+            return None, None
+
+        # omega only needs terms up to z^L, the higher ones vanish whenever
+        # the errors are correctable
+        S[0] = 1
+        omega = [sum(imap(mul, sigma, S[i::-1])) % p for i in xrange(L+1)]
+
+        polynomial = self.polynomial
+        return polynomial(reversed(sigma)), polynomial(reversed(omega))
+
+    def _euclid(self, S, erasures=()):
+        """Computes the error locator polynomial (sigma) and the error
+        evaluator polynomial (omega) like _berlekamp_massey(), which see for
+        the definitions, with Sugiyama's algorithm instead.
+
+        Writing S'(z) = S_1 + S_2 z + ... + S_(n-k) z^(n-k-1), the key
+        equation is
+        sigma(z) * S'(z) = Omega(z) mod z^(n-k)
+        with Omega of lower degree than sigma, and then omega(z) = sigma(z) +
+        z * Omega(z). The extended Euclidean algorithm on z^(n-k) and S'
+        gives a sequence of remainders r_i and multipliers u_i with
+        u_i * S' = r_i mod z^(n-k), and stopping at the first remainder of
+        degree under (n-k)/2, u_i is sigma and r_i Omega, both scaled by
+        u_i(0).
+
+        With erasures, S' is first multiplied by their locator Gamma(z),
+        the remainders go on until their degree is under (n-k+f)/2 for f
+        erasures, and sigma is Gamma * u_i. Each step divides the last two
+        remainders, in lists of plain ints lowest power first with table
+        inverses for the leading coefficients.
+
+        If there were more errors than can be corrected, sigma comes out
+        with too high a degree or too few roots, like with Berlekamp-Massey,
+        or Omega doesn't have a lower degree than sigma or u_i(0) is zero,
+        in which case this returns (None, None).
+        """
+        n = self.n
+        k = self.k
+        p = self.field.p
+        exptable = self.field.exptable
+        invtable = self.field.invtable
+        f = len(erasures)
+
+        # Gamma(z) = Product( 1 - α^e * z ) over the erasures
+        gamma = [1] + [0] * f
+        for d, e in enumerate(erasures, 1):
+            x = exptable[e]
+            for i in xrange(d, 0, -1):
+                gamma[i] = (gamma[i] - x * gamma[i-1]) % p
+
+        # Gamma * S' mod z^(n-k), trimmed to its degree
+        r = [sum(imap(mul, gamma, S[i+1:max(i-f, 0):-1])) % p
+                for i in xrange(n-k)]
+        while r and not r[-1]:
+            r.pop()
+        rprev = [0] * (n-k) + [1]
+        u = [1]
+        uprev = [0]
+
+        while 2 * len(r) > n-k+f + 1:
+            # Divide rprev by r, leaving the remainder in rprev and the
+            # quotient in q. r has len(r) - 1 > 0 as its degree.
+            dr = len(r) - 1
+            inverse = invtable[r[-1]]
+            q = [0] * (len(rprev) - dr)
+            for i in xrange(len(rprev) - 1, dr - 1, -1):
+                c = rprev[i] * inverse % p
+                if c:
+                    q[i-dr] = c
+                    rprev[i-dr:i] = [(x - c * y) % p
+                            for x, y in izip(rprev[i-dr:i], r)]
+            del rprev[dr:]
+            while rprev and not rprev[-1]:
+                rprev.pop()
+
+            # uprev - q * u becomes the multiplier of the new remainder
+            unext = uprev + [0] * (len(q) + len(u) - 1 - len(uprev))
+            for i, c in enumerate(q):
+                if c:
+                    unext[i:i+len(u)] = [(x - c * y) % p
+                            for x, y in izip(unext[i:i+len(u)], u)]
+
+            r, rprev = rprev, r
+            u, uprev = unext, u
+
+        # Without those two, the magnitudes from Forney's formula wouldn't
+        # reproduce the syndromes
+        if not u[0] or len(r) >= len(u) + f:
+            return None, None
+
+        # Scale by 1/u(0) so that sigma(0) = 1
+        scale = invtable[u[0]]
+        sigma = [0] * (len(u) + f)
+        for i, c in enumerate(gamma):
+            sigma[i:i+len(u)] = [x + c * y
+                    for x, y in izip(sigma[i:i+len(u)], u)]
+        sigma = [c * scale % p for c in sigma]
+        omega = sigma + [0] * (len(r) + 1 - len(sigma))
+        for i, c in enumerate(r, 1):
+            omega[i] = (omega[i] + c * scale) % p
+
+        polynomial = self.polynomial
+        return polynomial(reversed(sigma)), polynomial(reversed(omega))
 
     def _chien_search(self, sigma):
         """Recall the definition of sigma, it has s roots. To find them, this
-        function evaluates sigma at all 255 non-zero points to find the roots
-        The inverse of the roots are X_i, the error locations
-
-        Returns a list X of error locations, and a corresponding list j of
-        error positions (the discrete log of the corresponding X value) The
-        lists are up to s elements large.
-
-        Important technical math note: This implementation is not actually
-        Chien's search. Chien's search is a way to evaluate the polynomial
-        such that each evaluation only takes constant time. This here simply
-        does 255 evaluations straight up, which is much less efficient.
+        function evaluates sigma at the inverse of 2^j for every position j
+        in the codeword, to find the roots. The inverse of the roots are X_i,
+        the error locations. Only the n positions of the code are searched,
+        so a shortened code costs less, and a root that would put an error
+        outside of the codeword isn't found, which makes the block
+        uncorrectable rather than miscorrected.
+
+        Returns a list X of error locations, a corresponding list j of error
+        positions (the discrete log of the corresponding X value), and a list
+        D of X_i^-1 * sigma'(X_i^-1), the formal derivative of sigma at each
+        root scaled by the root, for Forney's formula. The lists are up to s
+        elements large.
+
+        This is Chien's search: register i holds the term sigma_i * α^(-j*i)
+        for the current position j, so moving on to the next position only
+        takes one table lookup per term, multiplying register i by α^-i, or
+        one modular multiplication without lookups. The search stops as soon
+        as deg(sigma) roots have been found. At a root, the registers
+        weighted by i sum to D.
+
+        With NumPy, a sigma of degree 2 or more is instead evaluated at every
+        field element at once with Polynomial.evaluate_all(), or at every
+        position for fields too big for a powtable, which takes less time
+        than stepping the registers through most of the positions of a code
+        that is at least 32 symbols long.
         """
-
         X = []
         j = []
-        p = PF59int(2)
-        for l in xrange(1,58):
-            # These evaluations could be more efficient, but oh well
-            if sigma.evaluate( p**l ) == 0:
-                X.append( (p**(-l)))
-                # This is different than the notes, I think the notes were in error
-                # Notes said j values were just l, when it's actually 255-l
-                j.append(58 - l)
-
-        return X, j
-
-    def _forney(self, omega, X):
-        """Computes the error magnitudes"""
-        # XXX Is floor division okay here? Should this be ceiling?
-        s = (self.n - self.k) // 2
-        Y = []
+        D = []
+
+        # Coefficients of sigma, lowest power first
+        c = sigma.raw[::-1]
+        deg = len(c) - 1
+        if deg < 1:
+            return X, j, D
+
+        field = self.field
+        p = field.p
+        exptable = field.exptable
+        points = self.plan.chienpoints
+        if numpy is not None and deg > 1 and self.n >= 32:
+            if field.powtable is not None:
+                values = sigma._evaluate(None)
+                j = [l for l, z in enumerate(points) if not values[z]]
+            else:
+                values = sigma._evaluate(list(points))
+                j = [l for l, v in enumerate(values) if not v]
+            # D is z * sigma'(z), the coefficients of sigma weighted by their
+            # powers, at each root z = α^-j
+            derivative = self.polynomial((i * c[i]) % p
+                    for i in xrange(deg, -1, -1))
+            D = derivative._evaluate([points[l] for l in j])
+            X = [field.elements[exptable[l]] for l in j]
+            return X, j, D
+
+        c0 = c[0]
+        registers = c[1:]
+        weights = xrange(1, deg+1)
+        rows = self.chienrows
+        if rows is not None:
+            rows = rows[1:deg+1]
+        steps = points[1:deg+1]
+
+        for l in xrange(self.n):
+            if (c0 + sum(registers)) % p == 0:
+                X.append(field.elements[exptable[l]])
+                j.append(l)
+                D.append(sum(imap(mul, weights, registers)) % p)
+                if len(j) == deg:
+                    break
+            if rows is not None:
+                registers = map(getitem, rows, registers)
+            else:
+                registers = [x * s % p for x, s in izip(registers, steps)]
 
-        for l, Xl in enumerate(X):
-            Yl = omega.evaluate( Xl.inverse() )
+        return X, j, D
 
-            # Compute the sequence product and multiply its inverse in
-            prod = PF59int(1)
-            for ji in xrange(len(X)):
-                if (ji!=l):
-                    prod = prod * (PF59int(1) - X[ji]*(Xl.inverse()))
-            Yl = Yl * prod.inverse()
+    def _forney(self, omega, j, D):
+        """Computes the error magnitudes with Forney's formula, given the
+        error positions j and the values D from _chien_search.
 
-            Y.append(Yl)
-        return Y
+        Since z * sigma'(z) is the sum of i * sigma_i * z^i, the formula
+        Y_l = -X_l * omega(X_l^-1) / sigma'(X_l^-1)
+        simplifies to Y_l = -omega(X_l^-1) / D_l. omega(X_l^-1), that is
+        omega at α^-j, is summed term by term through the log tables.
+        """
+        field = self.field
+        p = field.p
+        order = field.order
+        exptable = field.exptable
+        logtable = field.logtable
+        invtable = field.invtable
 
-if __name__ == "__main__":
-    import sys
-    coder = RSCoder(58,46)
-    if "-d" in sys.argv:
-        method = coder.decode
-        blocksize = 58
-    else:
-        method = coder.encode
-        blocksize = 46
+        # Logs of the non-zero coefficients of omega, with their powers
+        terms = [(i, logtable[c]) for i, c in enumerate(omega.raw[::-1]) if c]
 
-    while True:
-        block = sys.stdin.read(blocksize)
-        if not block: break
-        code = method(block)
-        sys.stdout.write(code)
+        Y = []
+        for jl, Dl in zip(j, D):
+            value = sum(exptable[(lc - i*jl) % order] for i, lc in terms) % p
+            Y.append(field.elements[-value * invtable[Dl] % p])
+        return Y
 
+def _chunks(f, size):
+    """Reads the file f in chunks of size bytes"""
+    while True:
+        data = f.read(size)
+        if not data:
+            break
+        yield data
+
+def _batches(items, size):
+    """Splits an iterable into lists of up to size items"""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            break
+        yield batch
+
+# The coder used by worker processes, set up once per process by _init_worker
+_worker_coder = None
+
+def _init_worker(tables, chars, solver):
+    global _worker_coder
+    n = tables['n']
+    k = tables['k']
+    p = tables['p']
+    CoderPlan.cache.setdefault((n, k, p), CoderPlan(n, k, tables))
+    alphabet = Alphabet(chars) if chars is not None else None
+    _worker_coder = RSCoder(n, k, alphabet=alphabet, field=PrimeField(p),
+            solver=solver)
+
+def _run_worker(method, batch, *extra):
+    return getattr(_worker_coder, method)(batch, *extra)
+
+def main(argv=None):
+    """Command line entry point, see the module documentation"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reed-Solomon encodes "
+            "standard in to standard out, or decodes it with -d.")
+    parser.add_argument("-d", "--decode", action="store_true",
+            help="decode instead of encoding")
+    parser.add_argument("-n", type=int, default=58,
+            help="codeword length (default 58)")
+    parser.add_argument("-k", type=int, default=46,
+            help="message length (default 46)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+            help="number of worker processes (default 1)")
+    parser.add_argument("-b", "--batch", type=int, default=4096,
+            help="blocks per read and per job (default 4096)")
+    parser.add_argument("-D", "--depth", type=int, default=1,
+            help="interleave codewords in groups of this many (default 1, "
+            "no interleaving)")
+    parser.add_argument("--solver", choices=SOLVERS, default=BERLEKAMP_MASSEY,
+            help="key equation solver used to decode (default %s)"
+            % BERLEKAMP_MASSEY)
+    parser.add_argument("--nostrip", action="store_true",
+            help="keep the padding of decoded blocks, see RSCoder.decode")
+    parser.add_argument("-q", "--quiet", action="store_true",
+            help="don't report statistics on standard error")
+    args = parser.parse_args(argv)
+
+    try:
+        coder = RSCoder(args.n, args.k, solver=args.solver)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.jobs < 1 or args.batch < 1 or args.depth < 1:
+        parser.error("--jobs, --batch and --depth must be at least 1")
+    # Chunks hold whole interleaving groups, except for the last one
+    batch = -(-args.batch // args.depth) * args.depth
+
+    if args.decode:
+        blocksize = args.n
+        method = "_decode_chunk"
+        extra = (args.nostrip, args.depth)
+    else:
+        blocksize = args.k
+        method = "_encode_chunk"
+        extra = (args.depth,)
+
+    # Input totals, counted as chunks are read
+    totals = {'bytes': 0, 'blocks': 0}
+    def chunks():
+        data = _chunks(sys.stdin, blocksize * batch)
+        if not args.decode:
+            # Line breaks, like the one echo adds, aren't part of the message
+            data = _groups((d.translate(None, "\r\n") for d in data),
+                    blocksize * batch)
+        for data in data:
+            totals['bytes'] += len(data)
+            totals['blocks'] += (len(data) + blocksize - 1) // blocksize
+            yield data
+
+    start = time.time()
+    corrected = 0
+    failed = 0
+    written = 0
+    try:
+        for out, c, f in coder._map_batches(method, chunks(), args.jobs,
+                extra):
+            sys.stdout.write(out)
+            written += len(out) // args.n
+            corrected += c
+            failed += f
+    except AlphabetError as e:
+        # Only encoding raises it, decoding erases invalid characters
+        sys.stdout.flush()
+        block, i = e.positions[0]
+        sys.stderr.write("Invalid character in message block %d at index %d,"
+                " stopping\n" % (written + block, i))
+        return 1
+    sys.stdout.flush()
+    elapsed = max(time.time() - start, 1e-9)
+
+    if not args.quiet:
+        sys.stderr.write("%d blocks, %d bytes in %.2f s (%.0f blocks/s, "
+                "%.2f MB/s)" % (totals['blocks'], totals['bytes'], elapsed,
+                    totals['blocks'] / elapsed, totals['bytes'] / elapsed / 1e6))
+        if args.decode:
+            sys.stderr.write(", %d corrected, %d failed" % (corrected, failed))
+        sys.stderr.write("\n")
+    return 1 if failed else 0
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,15 @@
 import unittest
 import itertools
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
 
+import polynomial
 import rs
+from ffp import PF59int, PrimeField
 from polynomial import Polynomial
 from rs import b58conv
 from rs import r58conv
@@ -33,6 +41,269 @@ class TestRSverify(unittest.TestCase):
 
             self.assertFalse(self.coder.verify(bad_code))
 
+class TestAlphabet(unittest.TestCase):
+    def test_convert(self):
+        s = "".join(map(r58conv, xrange(59)))
+        symbols = rs.BASE58.to_symbols(s)
+        self.assertEqual(list(symbols), range(59))
+        self.assertEqual(rs.BASE58.to_string(symbols), s)
+        self.assertEqual(rs.BASE58.to_string([3, 0, 58]), "30Z")
+        self.assertRaises(ValueError, rs.BASE58.to_string, [59])
+
+    def test_invalid(self):
+        """Every invalid character is reported at once"""
+        try:
+            rs.BASE58.to_symbols("abIcdOl")
+        except rs.AlphabetError as e:
+            self.assertEqual(e.positions, [2, 5, 6])
+            self.assertTrue(isinstance(e, ValueError))
+        else:
+            self.fail("AlphabetError not raised")
+        self.assertEqual(rs.BASE58.invalid("I0l"), [0, 2])
+        self.assertEqual(b58conv("I"), 101)
+        self.assertRaises(ValueError, rs.Alphabet, "0123")
+
+    def test_bytes(self):
+        s = "".join(map(r58conv, xrange(59)))
+        symbols = rs.BASE58.bytes_to_symbols(memoryview(s))
+        self.assertEqual(symbols, bytearray(range(59)))
+        self.assertEqual(rs.BASE58.symbols_to_bytes(symbols), bytearray(s))
+        try:
+            rs.BASE58.bytes_to_symbols(bytearray("abIcdOl"))
+        except rs.AlphabetError as e:
+            self.assertEqual(e.positions, [2, 5, 6])
+        else:
+            self.fail("AlphabetError not raised")
+
+    def test_unicode(self):
+        """unicode strings convert and code like byte strings"""
+        s = "".join(map(r58conv, xrange(59)))
+        self.assertEqual(rs.BASE58.to_symbols(unicode(s)),
+                rs.BASE58.to_symbols(s))
+        self.assertEqual(rs.BASE58.invalid(u"I0\xe9"), [0, 2])
+        self.assertRaises(rs.AlphabetError, rs.BASE58.to_symbols, u"\u20ac")
+
+        coder = rs.RSCoder(58, 46)
+        code = coder.encode("abc")
+        self.assertEqual(coder.encode(u"abc"), code)
+        self.assertEqual(coder.encode_many([u"abc"]), [code])
+        self.assertTrue(coder.verify(unicode(code)))
+        self.assertEqual(coder.decode(u"Z" + code[1:]), "abc")
+        self.assertEqual(coder.decode(u"\xe9" + code[1:], erasures=[0]),
+                "abc")
+        self.assertEqual([m for status, m, errors in coder.decode_many(
+            [unicode(code), u"Z" + code[1:]])], ["abc", "abc"])
+
+    def test_null_padding(self):
+        """Coders can pad with null bytes instead of "0" """
+        alphabet = rs.Alphabet("\0" + rs.BASE58.chars[1:])
+        coder = rs.RSCoder(20, 12, alphabet=alphabet)
+        code = coder.encode("xyz")
+        self.assertEqual(code[:12], "\0" * 9 + "xyz")
+        self.assertEqual(coder.decode(code), "xyz")
+        self.assertEqual(coder.decode("1" + code[1:]), "xyz")
+        self.assertEqual(coder.decode(code, nostrip=True), code[:12])
+        self.assertEqual(coder.encode_many(["xyz"]), [code])
+
+class TestCoderPlan(unittest.TestCase):
+    def test_shared(self):
+        """Coders with the same n and k share one plan"""
+        one = rs.RSCoder(30,20)
+        two = rs.RSCoder(30,20)
+        self.assertTrue(one.plan is two.plan)
+        self.assertTrue(one.ptable is two.ptable)
+        self.assertFalse(one.plan is rs.RSCoder(30,22).plan)
+
+    def test_cache_file(self):
+        """Plans survive a round trip through a cache file"""
+        cachedir = tempfile.mkdtemp()
+        try:
+            built = rs.CoderPlan(24,16)
+            rs.CoderPlan.cache.pop((24,16,59), None)
+            plan = rs.CoderPlan.get(24, 16, cachedir)
+            filename = os.path.join(cachedir, "rs-plan-24-16-59.marshal")
+            self.assertTrue(os.path.exists(filename))
+
+            loaded = rs.CoderPlan.load(filename, 24, 16)
+            self.assertEqual(loaded.tables(), built.tables())
+            self.assertEqual(loaded.chienrows, built.chienrows)
+            self.assertEqual(loaded.g, plan.g)
+            self.assertEqual(loaded.h, built.h)
+            self.assertEqual(rs.CoderPlan.load(filename, 24, 18), None)
+
+            rs.CoderPlan.cache.pop((24,16,59), None)
+            coder = rs.RSCoder(24, 16, cachedir=cachedir)
+            code = coder.encode("abc")
+            self.assertEqual(code, rs.RSCoder(24, 16).encode("abc"))
+            self.assertTrue(coder.verify(code))
+        finally:
+            shutil.rmtree(cachedir)
+
+class TestRSencoding(unittest.TestCase):
+    def test_polynomial(self):
+        """The table encoder agrees with encoding by polynomial division"""
+        for n, k in ((58,46), (20,12), (10,9)):
+            coder = rs.RSCoder(n, k)
+            for i in xrange(k+1):
+                message = "".join(r58conv((j * 11 + i) % 59)
+                        for j in xrange(i))
+                m = Polynomial(b58conv(x) for x in message)
+                mprime = m * Polynomial(x0=1).shift(n-k)
+                c = mprime - mprime % coder.g
+
+                self.assertEqual(coder.encode(message, poly=True), c)
+                code = coder.encode(message)
+                self.assertEqual(len(code), n)
+                self.assertEqual(
+                        "".join(r58conv(x) for x in c.raw).rjust(n, "0"),
+                        code)
+
+    def test_invalid(self):
+        coder = rs.RSCoder(58,46)
+        self.assertRaises(ValueError, coder.encode, "abcI")
+        self.assertRaises(ValueError, coder.encode, "a"*47)
+
+    def test_encode_into(self):
+        """Blocks are written back to back into any writable buffer"""
+        coder = rs.RSCoder(20,12)
+        messages = ["".join(r58conv((j * 5 + i) % 59) for j in xrange(12))
+                for i in xrange(5)]
+        src = bytearray("".join(messages))
+        dst = bytearray("-" * 103)
+        offset = 3
+        for i in xrange(0, len(src), 12):
+            offset = coder.encode_into(memoryview(src)[i:i+12], dst, offset)
+        self.assertEqual(offset, 103)
+        self.assertEqual(str(dst), "---" + "".join(map(coder.encode,
+            messages)))
+
+        symbols = bytearray(20)
+        coder.encode_into(coder.alphabet.to_symbols(messages[1]).tostring(),
+                memoryview(symbols), symbols=True)
+        self.assertEqual(coder.alphabet.to_string(symbols),
+                coder.encode(messages[1]))
+
+        self.assertRaises(ValueError, coder.encode_into, "abc", dst)
+        self.assertRaises(ValueError, coder.encode_into, "I" * 12, dst)
+        self.assertRaises(ValueError, coder.encode_into, "\x3b" * 12, dst,
+                symbols=True)
+
+    def _check_encode_many(self):
+        coder = rs.RSCoder(20,12)
+        messages = ["".join(r58conv((j * 7 + i) % 59) for j in xrange(i % 13))
+                for i in xrange(40)]
+        codes = [coder.encode(m) for m in messages]
+        self.assertEqual(coder.encode_many(messages), codes)
+
+        symbols = [[b58conv(x) for x in m.rjust(12, "0")] for m in messages]
+        many = coder.encode_many(symbols)
+        self.assertEqual(len(many), 40)
+        for row, code in zip(many, codes):
+            self.assertEqual(list(row), [b58conv(x) for x in code])
+
+        self.assertRaises(ValueError, coder.encode_many, ["abc", "I"])
+        self.assertRaises(ValueError, coder.encode_many, ["a"*13])
+        self.assertRaises(ValueError, coder.encode_many, [[0]*11])
+        self.assertRaises(ValueError, coder.encode_many, [[59]*12])
+
+        # Invalid characters are reported by block and index in the block,
+        # for every block at once
+        try:
+            coder.encode_many(["abc", "aIc", "xyz", "lO"])
+        except rs.AlphabetError as e:
+            self.assertEqual(e.positions, [(1, 1), (3, 0), (3, 1)])
+        else:
+            self.fail("AlphabetError not raised")
+        code = coder.encode("abc")
+        try:
+            coder.verify_many([code, code[:-1] + "I"])
+        except rs.AlphabetError as e:
+            self.assertEqual(e.positions, [(1, 19)])
+        else:
+            self.fail("AlphabetError not raised")
+
+    def test_encode_many(self):
+        self._check_encode_many()
+
+    def test_encode_many_python(self):
+        """encode_many without NumPy"""
+        numpy = rs.numpy
+        rs.numpy = None
+        try:
+            self._check_encode_many()
+        finally:
+            rs.numpy = numpy
+
+class TestRSsyndromes(unittest.TestCase):
+    def setUp(self):
+        self.coder = rs.RSCoder(20,12)
+        self.codes = [self.coder.encode("".join(r58conv((j * 5 + i) % 59)
+            for j in xrange(12))) for i in xrange(20)]
+        # Corrupt every other codeword in one position
+        for i in xrange(0, 20, 2):
+            c = self.codes[i]
+            self.codes[i] = c[:i] + r58conv((b58conv(c[i]) + 1) % 59) + c[i+1:]
+
+    def _check(self):
+        syndromes = self.coder.syndromes_many(self.codes)
+        mask = self.coder.verify_many(self.codes)
+        self.assertEqual(len(syndromes), 20)
+        for i, code in enumerate(self.codes):
+            r = Polynomial(b58conv(x) for x in code)
+            expected = [r.evaluate(PF59int(2) ** l) for l in xrange(1, 9)]
+            self.assertEqual(list(syndromes[i]), expected)
+            self.assertEqual(self.coder._syndromes(map(b58conv, code)),
+                    [0] + expected)
+            self.assertEqual(bool(mask[i]), i % 2 == 1)
+            self.assertEqual(bool(mask[i]), self.coder.verify(code))
+
+        symbols = [[b58conv(x) for x in code] for code in self.codes]
+        self.assertEqual(list(self.coder.verify_many(symbols)), list(mask))
+
+    def test_many(self):
+        self._check()
+
+    def test_many_python(self):
+        """syndromes_many and verify_many without NumPy"""
+        numpy = rs.numpy
+        rs.numpy = None
+        try:
+            self._check()
+        finally:
+            rs.numpy = numpy
+
+class TestRSchien(unittest.TestCase):
+    def _check_roots(self):
+        coder = rs.RSCoder(58,46)
+        for positions in ([], [0], [57], [0, 1, 2], [3, 17, 29, 40, 56, 57]):
+            sigma = Polynomial((1,))
+            for j in positions:
+                sigma = sigma * Polynomial((-pow(2, j, 59), 1))
+            X, j, D = coder._chien_search(sigma.scale(7))
+            self.assertEqual(sorted(j), positions)
+            self.assertEqual(X, [pow(2, l, 59) for l in j])
+
+            # D is the derivative of sigma, scaled by the root
+            derivative = Polynomial(c * (len(sigma) - 1 - i)
+                    for i, c in enumerate(sigma.scale(7).raw[:-1]))
+            for Xl, Dl in zip(X, D):
+                z = Xl.inverse()
+                self.assertEqual(Dl, z * derivative.evaluate(z))
+
+    def test_roots(self):
+        """Chien search finds every root of an error locator, including
+        position 0"""
+        self._check_roots()
+
+    def test_roots_python(self):
+        """Chien search with the registers instead of NumPy"""
+        numpy = rs.numpy
+        rs.numpy = None
+        try:
+            self._check_roots()
+        finally:
+            rs.numpy = numpy
+
 class TestRSdecoding(unittest.TestCase):
     def setUp(self):
         self.coder = rs.RSCoder(58,46)
@@ -92,6 +363,238 @@ class TestRSdecoding(unittest.TestCase):
         decode = self.coder.decode(r)
         self.assertEqual(self.string, decode)
 
+    def test_random_errors(self):
+        """Up to 6 errors anywhere in the codeword always decode"""
+        rand = random.Random(58)
+        for trial in xrange(100):
+            message = "".join(r58conv(rand.randint(1, 58)) for i in xrange(46))
+            r = map(b58conv, self.coder.encode(message))
+            for e in rand.sample(xrange(58), rand.randint(1, 6)):
+                r[e] = (r[e] + rand.randint(1, 58)) % 59
+            r = "".join(r58conv(x) for x in r)
+
+            self.assertEqual(message, self.coder.decode(r))
+
+    def test_single_table(self):
+        """Single errors are found in the table, everything else falls
+        through to the full decoder, and both agree"""
+        plain = rs.RSCoder(58, 46, singletable=False)
+        self.assertTrue(plain.singletable is None)
+        rand = random.Random(14)
+        for trial in xrange(60):
+            message = "".join(r58conv(rand.randint(1, 58)) for i in xrange(46))
+            r = map(b58conv, self.coder.encode(message))
+            for e in rand.sample(xrange(58), 1 + trial % 3):
+                r[e] = (r[e] + rand.randint(1, 58)) % 59
+            r = "".join(r58conv(x) for x in r)
+
+            self.assertEqual(message, self.coder.decode(r))
+            self.assertEqual(message, plain.decode(r))
+
+        self.assertEqual(self.coder.singlelookups, 60)
+        self.assertEqual(self.coder.singlehits, 20)
+        self.assertAlmostEqual(self.coder.singlehitrate, 1 / 3.)
+        self.assertEqual(plain.singlelookups, 0)
+
+        # Every entry of the table is a single error at a valid position
+        table = rs.RSCoder(20, 12).singletable
+        self.assertEqual(len(filter(None, table)), 20 * 58)
+        self.assertTrue(rs.RSCoder(10, 9).singletable is None)
+
+    def test_erasures(self):
+        """Known bad positions cost one parity symbol each, so 4 errors and
+        4 erasures still decode, and erased characters can be unreadable"""
+        rand = random.Random(15)
+        for trial in xrange(50):
+            message = "".join(r58conv(rand.randint(1, 58)) for i in xrange(46))
+            r = list(self.coder.encode(message))
+            positions = rand.sample(xrange(58), 8)
+            for e in positions[:4]:
+                r[e] = r58conv((b58conv(r[e]) + rand.randint(1, 58)) % 59)
+            for e in positions[4:]:
+                r[e] = "?"
+            r = "".join(r)
+
+            self.assertEqual(message,
+                    self.coder.decode(r, erasures=positions[4:]))
+            self.assertEqual(message, self.coder.decode(r,
+                erasures=self.coder.alphabet.invalid(r)))
+
+        # 12 erasures and no errors is the most a (58,46) code can take
+        r = "?" * 12 + self.code[12:]
+        self.assertEqual(self.string, self.coder.decode(r, erasures=range(12)))
+        r = self.code[:5] + "?" * 13 + self.code[18:]
+        self.assertEqual(r[:46],
+                self.coder.decode(r, nostrip=True, erasures=range(5, 18)))
+
+        # Erasures that turn out to be fine are harmless
+        self.assertEqual(self.string,
+                self.coder.decode(self.code, erasures=[0, 40, 57]))
+        self.assertRaises(ValueError, self.coder.decode, self.code,
+                erasures=[58])
+
+    def test_shortened(self):
+        """A shortened code never corrects a position outside its n
+        symbols, so whatever it does correct is within (n-k)/2 symbols of
+        what was received"""
+        coder = rs.RSCoder(20, 12)
+        rand = random.Random(18)
+        for trial in xrange(200):
+            message = "".join(r58conv(rand.randint(1, 58)) for i in xrange(12))
+            r = map(b58conv, coder.encode(message))
+            for e in rand.sample(xrange(20), rand.randint(1, 8)):
+                r[e] = (r[e] + rand.randint(1, 58)) % 59
+            r = "".join(r58conv(x) for x in r)
+
+            decoded, errors = coder._decode(r, nostrip=True)
+            if errors is not None:
+                c = coder.encode(decoded)
+                self.assertEqual(len(c), 20)
+                self.assertEqual(errors, sum(a != b for a, b in zip(c, r)))
+                self.assertTrue(errors <= 4)
+
+        # Short blocks are padded at the front
+        code = coder.encode("abc")
+        self.assertEqual(code[:9], "0" * 9)
+        self.assertEqual(coder.decode(code[9:12] + "z" + code[13:]), "abc")
+        self.assertRaises(ValueError, coder.decode, "0" + code)
+
+    def test_decode_into(self):
+        code = bytearray(self.code)
+        code[3] = "Z" if code[3] != ord("Z") else "Y"
+        code[40] = "?"
+        out = bytearray("-" * 50)
+        self.assertEqual(self.coder.decode_into(memoryview(code), out, 4,
+            erasures=[40]), 2)
+        self.assertEqual(str(out), "----" + self.string.rjust(46, "0"))
+
+        symbols = self.coder.alphabet.bytes_to_symbols(self.code)
+        symbols[10] = (symbols[10] + 1) % 59
+        out = bytearray(46)
+        self.assertEqual(self.coder.decode_into(symbols, out, symbols=True), 1)
+        self.assertEqual(self.coder.alphabet.to_string(out),
+                self.string.rjust(46, "0"))
+
+        # Too many errors leave the message as received
+        code = "z" * 7 + self.code[7:]
+        self.assertEqual(self.coder.decode_into(code, out), None)
+        self.assertEqual(str(out), code[:46])
+        self.assertRaises(ValueError, self.coder.decode_into, self.code[1:],
+                out)
+
+    def test_result(self):
+        """decode_result reports where and by how much the block was off"""
+        result = self.coder.decode_result(self.code)
+        self.assertEqual(result.status, rs.CLEAN)
+        self.assertEqual((result.positions, result.magnitudes), ((), ()))
+        self.assertEqual(result.errors, 0)
+        self.assertEqual(result.message, self.string)
+
+        r = map(b58conv, self.code)
+        for i, e in ((57, 3), (2, 58), (30, 1)):
+            r[i] = (r[i] + e) % 59
+        r = "".join(r58conv(x) for x in r)
+        result = self.coder.decode_result(r, nostrip=True)
+        self.assertEqual(result.status, rs.CORRECTED)
+        self.assertEqual(result.positions, (2, 30, 57))
+        self.assertEqual(result.magnitudes, (58, 1, 3))
+        self.assertEqual(result.errors, 3)
+        self.assertEqual(result.message, self.string.rjust(46, "0"))
+        self.assertEqual(result.codeword, self.code)
+
+        result = self.coder.decode_result("z" * 7 + self.code[7:])
+        self.assertEqual(result.status, rs.FAILED)
+        self.assertEqual(result.positions, None)
+        self.assertEqual(result.errors, None)
+        self.assertEqual(result.message, "z" * 7 + self.code[7:46])
+        self.assertEqual(result.codeword, "z" * 7 + self.code[7:])
+
+        # Erasures are measured against what was received: a right symbol
+        # isn't a correction, while a wrong or unreadable one is, whatever
+        # the symbol the erasure was filled with
+        right = self.coder.decode_result(self.code, erasures=[10, 50])
+        self.assertEqual(right.status, rs.CLEAN)
+        self.assertEqual(right.positions, ())
+        r = self.code[:10] + "a" + self.code[11:50] + "?" + self.code[51:]
+        result = self.coder.decode_result(r, erasures=[10, 50])
+        self.assertEqual(result.status, rs.CORRECTED)
+        self.assertEqual(result.positions, (10, 50))
+        self.assertEqual(result.magnitudes, (b58conv("a"), None))
+        self.assertEqual(result.codeword, self.code)
+        r = self.code[:50] + r58conv(b58conv(self.code[50]) + 3) + \
+                self.code[51:]
+        result = self.coder.decode_result(r, erasures=[10, 50])
+        self.assertEqual((result.positions, result.magnitudes), ((50,), (3,)))
+        dst = bytearray(46)
+        self.assertEqual(self.coder.decode_into(self.code, dst,
+            erasures=[10, 50]), 0)
+        self.assertEqual(self.coder.decode_into(r, dst, erasures=[10, 50]), 1)
+
+        # More erasures than parity symbols fail without decoding, but still
+        # have the received symbols and count as failed
+        coder = rs.RSCoder(58, 46, instrument=True)
+        r = "z" * 13 + self.code[13:]
+        result = coder.decode_result(r, erasures=range(13))
+        self.assertEqual(result.status, rs.FAILED)
+        self.assertEqual(result.codeword, "0" * 13 + self.code[13:])
+        self.assertEqual(result.message, r[:46])
+        self.assertEqual(coder.stats()['blocks'][rs.FAILED], 1)
+
+    def test_too_many(self):
+        """Uncorrectable codewords come back as received rather than with
+        spurious corrections"""
+        errors = [0, 1, 2, 3, 4, 5, 6]
+        r = list(b58conv(x) for x in self.code)
+        for e in errors:
+            r[e] = (r[e] + 1) % 59
+        r = "".join(r58conv(x) for x in r)
+
+        self.assertEqual(self.coder.decode(r, nostrip=True), r[:46])
+
+    def test_euclid(self):
+        """The Euclidean solver corrects exactly what Berlekamp-Massey does,
+        on random errors and erasures up to and past what can be corrected,
+        and neither corrects a block into something that isn't a codeword"""
+        rand = random.Random(25)
+        for n, k, field in ((58, 46, PF59int), (20, 12, PF59int),
+                (10, 8, PF59int), (40, 30, PrimeField(257))):
+            p = field.p
+            coders = [rs.RSCoder(n, k, field=field, singletable=False,
+                solver=solver) for solver in rs.SOLVERS]
+            self.assertEqual(coders[1].solver, rs.EUCLID)
+            for trial in xrange(200):
+                r = [rand.randint(1, p-1) for i in xrange(k)]
+                if field is PF59int:
+                    r = map(b58conv, coders[0].encode(
+                        "".join(r58conv(x) for x in r)))
+                else:
+                    r = list(coders[0].encode(r))
+                f = rand.randint(0, n-k)
+                e = rand.randint(0, (n-k-f)//2 + 2)
+                positions = rand.sample(xrange(n), e + f)
+                for i in positions:
+                    r[i] = (r[i] + rand.randint(1, p-1)) % p
+                if field is PF59int:
+                    r = "".join(r58conv(x) for x in r)
+
+                results = [c.decode_result(r, True, positions[e:])
+                        for c in coders]
+                bm, euclid = results
+                self.assertEqual(bm.status, euclid.status)
+                self.assertEqual(bm.positions, euclid.positions)
+                self.assertEqual(bm.message, euclid.message)
+                if 2*e + f <= n-k:
+                    self.assertNotEqual(bm.status, rs.FAILED)
+                if bm.status == rs.CORRECTED:
+                    self.assertTrue(coders[0].verify(bm.codeword))
+
+        # Syndromes S1 = 15, S2 = 0 fit a locator of degree 0 after two
+        # steps, which mustn't pass for a block with nothing to correct
+        coder = rs.RSCoder(10, 8)
+        self.assertEqual(coder._berlekamp_massey([0, 15, 0]), (None, None))
+        self.assertEqual(coder._euclid([0, 15, 0]), (None, None))
+        self.assertRaises(ValueError, rs.RSCoder, 58, 46, solver="peterson")
+
     def test_17err(self):
         """Kinda pointless, checks that 17 errors doesn't decode.
         Actually, this could still decode by coincidence on some inputs,
@@ -107,5 +610,316 @@ class TestRSdecoding(unittest.TestCase):
         self.assertNotEqual(self.string, decode)
 
 
+class TestRSmany(unittest.TestCase):
+    def setUp(self):
+        self.coder = rs.RSCoder(20,12)
+        self.messages = ["".join(r58conv((j * 3 + i) % 58 + 1)
+            for j in xrange(12)) for i in xrange(30)]
+        self.codes = self.coder.encode_many(self.messages)
+
+        # Every third block gets one error, every seventh too many
+        self.received = []
+        for i, code in enumerate(self.codes):
+            code = bytearray(code)
+            if i % 3 == 0:
+                code[i % 20] = "Z" if code[i % 20] != ord("Z") else "Y"
+            if i % 7 == 1:
+                code[:6] = "1" * 6
+            self.received.append(str(code))
+
+    def check(self, results):
+        self.assertEqual(len(results), 30)
+        for i, (status, message, errors) in enumerate(results):
+            if i % 7 == 1:
+                self.assertEqual(status, rs.FAILED)
+                self.assertEqual(errors, None)
+            elif i % 3 == 0:
+                self.assertEqual(status, rs.CORRECTED)
+                self.assertEqual(errors, 1)
+                self.assertEqual(message, self.messages[i])
+            else:
+                self.assertEqual(status, rs.CLEAN)
+                self.assertEqual(errors, 0)
+                self.assertEqual(message, self.messages[i])
+
+    def test_decode_many(self):
+        results = self.coder.decode_many(iter(self.received), batchsize=4)
+        self.check(list(results))
+
+    def test_invalid(self):
+        """A character outside the alphabet only affects its own block"""
+        received = list(self.received[:8])
+        received[2] = received[2][:5] + "I" + received[2][6:]
+        received[5] = "\n" * 9 + received[5][9:]
+        received.append("l" + self.codes[8][1:])
+        results = list(self.coder.decode_many(received, batchsize=4))
+        self.assertEqual(len(results), 9)
+        expected = [r for r in self.coder.decode_many(self.received[:9])]
+        for i, result in enumerate(results):
+            if i == 5:
+                self.assertEqual(result, (rs.FAILED, received[5][:12], None))
+            elif i not in (2, 8):
+                self.assertEqual(result, expected[i])
+        self.assertEqual(results[2], (rs.CORRECTED, expected[2][1],
+            expected[2][2] + 1))
+        self.assertEqual(results[8], (rs.CORRECTED, self.messages[8], 1))
+
+    def test_jobs(self):
+        results = self.coder.decode_many(self.received, jobs=2, batchsize=4)
+        self.check(list(results))
+
+        codes = self.coder.encode_many(iter(self.messages), jobs=2,
+                batchsize=4)
+        self.assertEqual(codes, self.codes)
+
+        # Batches are encoded as they are asked for, even from an endless
+        # iterable of messages
+        for jobs in (None, 2):
+            batches = self.coder.encode_batches(
+                    itertools.cycle(self.messages), jobs, batchsize=4)
+            codes = list(itertools.islice(batches, 3))
+            batches.close()
+            self.assertEqual(map(len, codes), [4, 4, 4])
+            self.assertEqual(sum(codes, []), (self.codes * 2)[:12])
+
+        # Stopping early shuts the pool down
+        results = self.coder.decode_many(self.received, jobs=2, batchsize=4)
+        self.assertEqual(results.next()[0], rs.CORRECTED)
+        results.close()
+
+    def test_stats(self):
+        """An instrumented coder counts every block and stage, a plain one
+        keeps no stats"""
+        self.assertEqual(self.coder.stats(), None)
+        coder = rs.RSCoder(20, 12, instrument=True)
+        results = list(coder.decode_many(self.received, batchsize=4))
+        self.check(results)
+
+        stats = coder.stats(reset=True)
+        statuses = [status for status, message, errors in results]
+        for status in (rs.CLEAN, rs.CORRECTED, rs.FAILED):
+            self.assertEqual(stats['blocks'][status], statuses.count(status))
+        self.assertEqual(stats['errors'], {1: statuses.count(rs.CORRECTED)})
+        positions = {}
+        for i, status in enumerate(statuses):
+            if status == rs.CORRECTED:
+                positions[i % 20] = positions.get(i % 20, 0) + 1
+        self.assertEqual(stats['positions'], positions)
+        dirty = len(self.received) - statuses.count(rs.CLEAN)
+        self.assertEqual(stats['calls']['decode'], dirty)
+        self.assertEqual(stats['calls']['syndromes'], dirty)
+        self.assertTrue(stats['time']['decode'] > 0)
+
+        self.assertEqual(coder.stats()['blocks'][rs.CLEAN], 0)
+        self.assertEqual(coder.decode(self.received[2]), self.messages[2])
+        self.assertEqual(coder.stats()['calls']['decode'], 1)
+        self.assertEqual(coder.stats()['blocks'][rs.CLEAN], 1)
+
+class TestRSfields(unittest.TestCase):
+    """Coders over other prime fields work on symbols, with or without the
+    plan's lookup tables"""
+    def check(self, coder):
+        n, k, p = coder.n, coder.k, coder.field.p
+        rand = random.Random(n)
+        message = [rand.randint(0, p-1) for i in xrange(k)]
+        code = coder.encode(message)
+        self.assertEqual(code.typecode, coder.field.typecode)
+        self.assertEqual(list(code[:k]), message)
+        self.assertTrue(coder.verify(code))
+        self.assertEqual(coder.encode(message[3:]), coder.encode(
+            [0, 0, 0] + message[3:]))
+
+        for errors in xrange((n-k)//2 + 1):
+            r = list(code)
+            positions = sorted(rand.sample(xrange(n), errors))
+            for i in positions:
+                r[i] = (r[i] + rand.randint(1, p-1)) % p
+            result = coder.decode_result(r, nostrip=True)
+            self.assertEqual(list(result.message), message)
+            self.assertEqual(list(result.positions), positions)
+            self.assertEqual(result.codeword, code)
+
+        # Erasures take one parity symbol each
+        r = list(code)
+        erasures = range(0, n, n // (n-k))[:n-k]
+        for i in erasures:
+            r[i] = p - 1 - r[i]
+        self.assertEqual(list(coder.decode(r, True, erasures)), message)
+
+        messages = [message, [0] * k, [p-1] * k]
+        codes = coder.encode_many(messages)
+        self.assertEqual([list(c) for c in codes],
+                [list(coder.encode(m)) for m in messages])
+        self.assertFalse(any(map(any, coder.syndromes_many(codes))))
+        results = list(coder.decode_many([list(c) for c in codes]))
+        self.assertEqual([list(m) for status, m, errors in results],
+                [message, [], [p-1] * k])
+        self.assertRaises(ValueError, coder.encode, [p] * k)
+        self.assertRaises(ValueError, coder.encode, [0] * (k+1))
+
+    def test_257(self):
+        field = PrimeField(257)
+        coder = rs.RSCoder(255, 223, field=field)
+        self.assertFalse(coder.plan.lookups)
+        self.check(coder)
+        # Short enough for the lookup tables
+        coder = rs.RSCoder(40, 30, field=field)
+        self.assertTrue(coder.plan.lookups)
+        self.check(coder)
+
+    def test_65537(self):
+        self.check(rs.RSCoder(300, 280, field=PrimeField(65537)))
+
+    def test_ntt(self):
+        """Long codes encode and compute syndromes with NTTs, and agree with
+        the direct methods. Without NumPy the threshold is lowered so that
+        the same code uses them."""
+        coder = rs.RSCoder(512, 448, field=PrimeField(65537))
+        thresholds = rs.NTT_WORK, rs.NTT_WORK_PYTHON
+        try:
+            rs.NTT_WORK_PYTHON = rs.NTT_WORK
+            self.assertTrue(coder.plan.transforms is not None)
+            self.assertEqual(rs.RSCoder(64, 60,
+                field=PrimeField(65537)).plan.transforms, None)
+            self.check(coder)
+
+            rand = random.Random(1)
+            message = [rand.randint(0, 65536) for i in xrange(448)]
+            code = coder.encode(message)
+            received = [rand.randint(0, 65536) for i in xrange(512)]
+            transforms = coder.plan.transforms
+
+            rs.NTT_WORK = rs.NTT_WORK_PYTHON = 1 << 30
+            self.assertEqual(coder.plan.transforms, None)
+            self.assertEqual(coder.encode(message), code)
+            self.assertEqual(coder._syndromes(received),
+                    [0] + transforms.syndromes(received))
+        finally:
+            rs.NTT_WORK, rs.NTT_WORK_PYTHON = thresholds
+
+    def test_python(self):
+        numpy = rs.numpy
+        try:
+            rs.numpy = polynomial.numpy = None
+            self.check(rs.RSCoder(40, 30, field=PrimeField(257)))
+            self.check(rs.RSCoder(64, 48, field=PrimeField(65537)))
+        finally:
+            rs.numpy = polynomial.numpy = numpy
+
+    def test_invalid(self):
+        field = PrimeField(257)
+        self.assertRaises(ValueError, rs.RSCoder, 257, 200, field=field)
+        self.assertRaises(ValueError, rs.RSCoder, 30, 20, field=field,
+                alphabet=rs.BASE58)
+        coder = rs.RSCoder(30, 20, field=field)
+        self.assertRaises(ValueError, coder.encode, "abc")
+        self.assertRaises(ValueError, coder.encode_into, "\0" * 20,
+                bytearray(30), symbols=True)
+
+        coder = rs.RSCoder(30, 20, field=PrimeField(251))
+        dst = bytearray(30)
+        self.assertEqual(coder.encode_into("\xfa" * 20, dst, symbols=True), 30)
+        self.assertEqual(list(dst), list(coder.encode([250] * 20)))
+        self.assertRaises(ValueError, coder.encode_into, "\0" * 20, dst)
+
+class TestCommandLine(unittest.TestCase):
+    def run_rs(self, args, data):
+        p = subprocess.Popen([sys.executable, rs.__file__.replace(".pyc", ".py")]
+                + args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+        out, err = p.communicate(data)
+        return p.returncode, out, err
+
+    def test_roundtrip(self):
+        data = "".join(r58conv(i % 58 + 1) for i in xrange(46 * 50 + 11))
+        status, code, err = self.run_rs(["-b", "7"], data)
+        self.assertEqual(status, 0)
+        self.assertEqual(len(code), 58 * 51)
+        self.assertTrue("51 blocks" in err)
+
+        status, code2, err = self.run_rs(["-q", "-j", "2", "-b", "7"], data)
+        self.assertEqual(code2, code)
+        self.assertEqual(err, "")
+
+        # Corrupt a few blocks, and one beyond repair
+        bad = bytearray(code)
+        for i in (3, 100, 1000, 1001):
+            bad[i] = "Z" if bad[i] != ord("Z") else "Y"
+        bad[58*40:58*40+7] = "1" * 7
+        status, decoded, err = self.run_rs(["-d", "-j", "2", "-b", "7"],
+                str(bad))
+        self.assertEqual(status, 1)
+        self.assertTrue("3 corrected, 1 failed" in err)
+        self.assertEqual(decoded[:46*40], data[:46*40])
+        self.assertEqual(decoded[46*41:], data[46*41:])
+
+        status, decoded2, err2 = self.run_rs(["-d", "-j", "2", "-b", "7",
+            "--solver", "euclid"], str(bad))
+        self.assertEqual((status, decoded2), (1, decoded))
+        self.assertTrue("3 corrected, 1 failed" in err2)
+
+    def test_depth(self):
+        """With -D a burst over several codewords is corrected"""
+        data = "".join(r58conv(i % 58 + 1) for i in xrange(46 * 30))
+        status, code, err = self.run_rs(["-q", "-D", "4", "-b", "5"], data)
+        self.assertEqual(len(code), 58 * 30)
+        bad = bytearray(code)
+        bad[300:324] = "Z" * 24
+        status, decoded, err = self.run_rs(["-d", "-D", "4", "-b", "3"],
+                str(bad))
+        self.assertEqual(status, 0)
+        self.assertTrue("4 corrected, 0 failed" in err)
+        self.assertEqual(decoded, data)
+
+        # A trailing line break is erased, and a truncated last group fails
+        # without stopping the tool
+        status, decoded, err = self.run_rs(["-d", "-D", "4", "-b", "3"],
+                str(bad) + "\n")
+        self.assertEqual(status, 0)
+        self.assertEqual(decoded, data)
+        status, decoded, err = self.run_rs(["-d", "-D", "4", "-b", "3"],
+                str(bad)[:-30])
+        self.assertEqual(status, 1)
+        self.assertFalse("Traceback" in err)
+        self.assertEqual(decoded[:46*28], data[:46*28])
+
+    def test_line_breaks(self):
+        """Encoding skips line breaks, and stops with a message rather than a
+        traceback at any other invalid character"""
+        status, code, err = self.run_rs(["-q"], "abc")
+        self.assertEqual(self.run_rs(["-q"], "abc\n"), (0, code, ""))
+        self.assertEqual(self.run_rs(["-q", "-k", "4", "-b", "1"], "ab\r\ncd"),
+                self.run_rs(["-q", "-k", "4", "-b", "1"], "abcd"))
+
+        data = "a" * 46 * 3 + "xIz"
+        for jobs in ("1", "2"):
+            status, out, err = self.run_rs(["-b", "2", "-j", jobs], data)
+            self.assertEqual(status, 1)
+            self.assertFalse("Traceback" in err)
+            self.assertTrue("Invalid character in message block 3 at index 1"
+                    in err)
+            self.assertEqual(len(out), 58 * 2)
+
+    def test_invalid_input(self):
+        """Characters outside the alphabet are decoded as erasures, and
+        blocks with too many of them fail without stopping the tool"""
+        data = "".join(r58conv(i % 58 + 1) for i in xrange(46 * 10))
+        status, code, err = self.run_rs(["-q"], data)
+        bad = bytearray(code)
+        bad[3:5] = "\n\n"
+        bad[100] = "I"
+        bad[58*5:58*5+13] = "-" * 13
+        status, decoded, err = self.run_rs(["-d", "-b", "4"], str(bad))
+        self.assertEqual(status, 1)
+        self.assertTrue("2 corrected, 1 failed" in err)
+        self.assertEqual(decoded[:46*5], data[:46*5])
+        self.assertEqual(decoded[46*6:], data[46*6:])
+
+    def test_options(self):
+        status, code, err = self.run_rs(["-n", "20", "-k", "12", "-q"], "abc")
+        self.assertEqual(code, rs.RSCoder(20, 12).encode("abc"))
+        status, out, err = self.run_rs(["-n", "20", "-k", "30"], "")
+        self.assertEqual(status, 2)
+
 if __name__ == "__main__":
     unittest.main()